@@ -1,9 +1,10 @@
 import os
-import io
 import json
+import tempfile
+import threading
+from concurrent.futures import Future
 import numpy as np
-import pandas as pd
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -13,8 +14,26 @@ app = Flask(__name__)
 # Enable CORS for all routes, allowing all origins, methods, and headers
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
-import gc
-import tensorflow as tf
+import ecg_features
+from batcher import MicroBatcher
+from csv_stream import CsvRowReader, read_csv_row
+from inference_pool import INFERENCE_POOL_REPLICAS, InferencePool, PoolClient
+from llm_cache import LLMResponseCache, bucket_context, bucket_features, normalize_question
+from llm_client import LLMClient, is_error_text
+from model_manager import ModelManager
+from prediction_cache import CachedPredictor, PredictionCache
+from preprocessing import TARGET_FS, batch_buffer, preprocess_batch, preprocess_signal
+from rhythm import RHYTHM_HOP_SECONDS, RHYTHM_WINDOW_SECONDS, RhythmAnalyzer
+from sample_store import NO_LABEL, SampleDataset
+from segmentation import StreamingBeatSegmenter
+from upload_store import UploadStore, UploadTooLarge
+from signal_codec import (
+    BINARY_DTYPES,
+    BINARY_MIMETYPES,
+    RAW_MIMETYPE,
+    decode_binary_signal,
+    scale_samples,
+)
 
 # ---------------------------------------------------------------------------
 # Constants
@@ -75,25 +94,117 @@ CLASS_SEVERITY = {
 
 TARGET_LENGTH = 186
 MODEL_ACCURACY = 99.20
+# Rows per model call in the batch endpoint (larger = faster, more memory)
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", 1024))
 
 # ---------------------------------------------------------------------------
-# Load Keras model (lazy – loaded once on first request)
+# Load Keras model (once per worker, kept warm – see model_manager.py)
 # ---------------------------------------------------------------------------
-_model = None
+_model_manager = ModelManager()
 
 
 def get_model():
-    global _model
-    if _model is None:
-        from tensorflow.keras.models import load_model  # noqa: E402
+    """Return the resident, warmed model manager (loading it on first use)."""
+    if not _model_manager.ready:
+        _model_manager.load()
+    return _model_manager
+
+
+# ---------------------------------------------------------------------------
+# Dedicated inference replicas (see inference_pool.py)
+# With INFERENCE_POOL_REPLICAS > 0 workers send windows to the replicas
+# through shared memory instead of each loading its own model copy.
+# ---------------------------------------------------------------------------
+_inference_pool = PoolClient() if INFERENCE_POOL_REPLICAS > 0 else None
+
+
+def model_predict(X: np.ndarray, batch_size=None) -> np.ndarray:
+    """Class probabilities from the inference pool if running, else in-process."""
+    if _inference_pool is not None and _inference_pool.available:
+        return _inference_pool.predict(X, batch_size=batch_size)
+    return get_model().predict(X, batch_size=batch_size)
+
+
+# ---------------------------------------------------------------------------
+# Startup. MODEL_PRELOAD=background (default) warms the model on a thread, so
+# a new worker answers /api/health at once and /api/ready turns 200 when the
+# model is warm; "true" loads it before serving, "false" on first use.
+# ---------------------------------------------------------------------------
+MODEL_PRELOAD = os.environ.get("MODEL_PRELOAD", "background").lower()
+_model_load_error = None
+
+
+def _preload_model():
+    global _model_load_error
+    try:
+        get_model()
+        _model_load_error = None
+    except Exception as e:
+        _model_load_error = str(e)
+        print(f"[ERROR] Model preload failed: {e}")
+
+
+def model_ready() -> bool:
+    if _inference_pool is not None:
+        return _inference_pool.available
+    return _model_manager.ready or MODEL_PRELOAD == "false"
+
+
+# Worker processes started with "spawn" (report rendering) re-import this
+# module as __mp_main__ and must not load the model.
+if __name__ != "__mp_main__" and _inference_pool is None:
+    if MODEL_PRELOAD == "background":
+        threading.Thread(target=_preload_model, name="model-preload", daemon=True).start()
+    elif MODEL_PRELOAD == "true":
+        get_model()
+
+
+@app.teardown_request
+def enforce_model_memory_budget(exc):
+    _model_manager.enforce_memory_budget()
 
-        model_path = os.environ.get(
-            "MODEL_PATH",
-            os.path.join(os.path.dirname(__file__), "best_model.h5"),
-        )
-        _model = load_model(model_path, compile=False)
-        print(f"[INFO] Model loaded from {model_path}")
-    return _model
+
+# ---------------------------------------------------------------------------
+# Micro-batching of concurrent single-beat predictions (see batcher.py)
+# Only useful with a threaded server, e.g. `gunicorn app:app --threads 8`
+# ---------------------------------------------------------------------------
+MICROBATCH_ENABLED = os.environ.get("MICROBATCH_ENABLED", "false").lower() == "true"
+
+_batcher = MicroBatcher(
+    lambda batch: model_predict(batch),
+    max_batch_size=int(os.environ.get("MICROBATCH_MAX_SIZE", 64)),
+    max_wait_ms=float(os.environ.get("MICROBATCH_MAX_WAIT_MS", 5)),
+)
+
+
+def _predict_uncached(X: np.ndarray, batch_size=None) -> np.ndarray:
+    """Run the model, coalescing single windows with other requests if enabled."""
+    if MICROBATCH_ENABLED and len(X) == 1:
+        return _batcher.predict(X[0])[np.newaxis, :]
+    return model_predict(X, batch_size=batch_size)
+
+
+# ---------------------------------------------------------------------------
+# Prediction cache (see prediction_cache.py)
+# Shared by predict, predict/batch, predict/image, explain and reports.
+# ---------------------------------------------------------------------------
+_prediction_cache = PredictionCache()
+_model_version = None
+
+
+def model_version() -> str:
+    global _model_version
+    if _model_version is None:
+        _model_version = _model_manager.version
+    return _model_version
+
+
+_predictor = CachedPredictor(_predict_uncached, _prediction_cache, model_version)
+
+
+def predict_beat(X: np.ndarray) -> np.ndarray:
+    """Predict one preprocessed (1, 186, 1) window (cached)."""
+    return _predictor.predict(X)
 
 @app.after_request
 def add_cors_headers(response):
@@ -106,198 +217,255 @@ def add_cors_headers(response):
 from typing import Optional
 
 # ---------------------------------------------------------------------------
-# LLM helper (Groq)
+# LLM helper (Groq, see llm_client.py)
 # ---------------------------------------------------------------------------
+_llm_client = LLMClient()
+
+
 def get_llm_response(user_message: str, context: Optional[dict] = None) -> str:
     """Call Groq API (Llama 3) to get an LLM response about ECG / arrhythmia."""
-    api_key = os.environ.get("GROQ_API_KEY")
-    if not api_key:
-        return (
-            "LLM integration is not configured. Please set the GROQ_API_KEY "
-            "environment variable to enable AI-powered insights."
-        )
+    return _llm_client.complete(user_message, context)
 
-    try:
-        from groq import Groq
-
-        client = Groq(api_key=api_key)
-        
-        system_prompt = (
-            "You are HeartAI, a helpful medical AI assistant specializing in "
-            "ECG analysis and cardiac arrhythmias. You provide clear, accurate, "
-            "and educational information about heart conditions, ECG "
-            "interpretations, and arrhythmia types. Always remind users to "
-            "consult healthcare professionals for medical decisions. "
-            "Keep responses concise but informative. Use markdown formatting."
-        )
 
-        context_str = ""
-        if context:
-            context_str = (
-                f"\n\nCurrent ECG Analysis Context:\n"
-                f"- Detected beat type: {context.get('beat_type', 'N/A')}\n"
-                f"- Confidence: {context.get('confidence', 'N/A')}\n"
-                f"- Severity: {context.get('severity', 'N/A')}\n"
-            )
+# Answers are cached by bucketed/normalized inputs (see llm_cache.py)
+_llm_cache = LLMResponseCache()
 
-        full_prompt = f"{context_str}\n\nUser question: {user_message}"
-
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": full_prompt}
-            ],
-            temperature=0.5,
-            max_tokens=512,
-            top_p=1,
-            stream=False,
-            stop=None,
-        )
 
-        return completion.choices[0].message.content
-    except Exception as e:
-        return f"Error communicating with LLM: {str(e)}"
+def _remember_llm_answer(cache_key, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    if not is_error_text(future.result()):
+        _llm_cache.put(cache_key, future.result())
+
+
+def start_llm_answer(cache_key, user_message, context=None):
+    """Future of the answer: from the LLM cache, or a new call that fills it."""
+    cached = _llm_cache.get(cache_key)
+    if cached is not None:
+        future = Future()
+        future.set_result(cached)
+        return future
+    future = _llm_client.start(user_message, context)
+    future.add_done_callback(lambda f: _remember_llm_answer(cache_key, f))
+    return future
+
+
+def stream_llm_answer(cache_key, user_message, context=None):
+    """Iterator over answer text pieces; a cached answer comes as one piece."""
+    cached = _llm_cache.get(cache_key)
+    if cached is not None:
+        return iter([cached])
+    tokens = _llm_client.stream(user_message, context)
+
+    def remember():
+        pieces = []
+        for piece in tokens:
+            pieces.append(piece)
+            yield piece
+        if pieces and not is_error_text(pieces[-1]):
+            _llm_cache.put(cache_key, "".join(pieces))
+
+    return remember()
+
+
+def prefers_event_stream(accept) -> bool:
+    """Whether a parsed Accept header (werkzeug MIMEAccept) ranks SSE above JSON."""
+    return accept.best_match(["application/json", "text/event-stream"]) == "text/event-stream"
+
+
+def wants_event_stream() -> bool:
+    """`?stream=true` or an `Accept: text/event-stream` header."""
+    if request.args.get("stream", "").lower() in ("true", "1", "yes"):
+        return True
+    return prefers_event_stream(request.accept_mimetypes)
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ---------------------------------------------------------------------------
 # Signal processing helpers
 # ---------------------------------------------------------------------------
-def add_gaussian_noise(signal: np.ndarray, target_length: int = TARGET_LENGTH):
-    """Pad or truncate a signal to the target length."""
-    current_length = len(signal)
-    noise_length = target_length - current_length
-    if noise_length > 0:
-        noise = np.random.normal(0, 0.5, noise_length)
-        return np.concatenate((signal, noise), axis=0)
-    elif noise_length < 0:
-        return signal[:target_length]
-    return signal
-
+def signal_quality(raw: np.ndarray):
+    """Signal Quality Index from an SNR approximation: (label, snr)."""
+    smoothed = np.convolve(raw, np.ones(5)/5, mode='same')
+    noise = raw - smoothed
+    snr = float(np.std(raw) / (np.std(noise) + 1e-6))
 
-def preprocess_signal(raw_values: np.ndarray) -> np.ndarray:
-    """Take raw 1-D signal values, pad/trim, reshape for the CNN model."""
-    processed = add_gaussian_noise(raw_values, TARGET_LENGTH)
-    return processed.reshape(1, TARGET_LENGTH, 1)
+    sqi_quality = "Good"
+    if snr < 2.0:
+        sqi_quality = "Poor"
+    elif snr < 5.0:
+        sqi_quality = "Fair"
+    return sqi_quality, snr
 
 
 # ---------------------------------------------------------------------------
 # Explainability (Occlusion Sensitivity)
 # ---------------------------------------------------------------------------
+def occlusion_masks(length, window_sizes, strides):
+    """
+    Boolean (n_windows, length) matrix, one row per occluded window, for
+    every (window_size, stride) pair, built with a single broadcast compare.
+    """
+    starts, widths = [], []
+    for window_size, stride in zip(window_sizes, strides):
+        s = np.arange(0, length - window_size, stride)
+        starts.append(s)
+        widths.append(np.full(len(s), window_size))
+    starts = np.concatenate(starts)[:, np.newaxis]
+    ends = starts + np.concatenate(widths)[:, np.newaxis]
+    positions = np.arange(length)
+    return (positions >= starts) & (positions < ends)
+
+
 def explain_prediction(model, signal, target_class_idx, window_size=10, stride=5):
     """
     Generate an importance heatmap using occlusion sensitivity.
     We slide a zero-mask over the signal and measure the drop in confidence.
     Higher drop = Higher importance.
+
+    `window_size` and `stride` may also be lists (paired up, or a single
+    stride shared by all sizes); every occlusion of every size runs in the
+    same model call as the base prediction. `model` is a CachedPredictor
+    such as `_predictor`; only the base prediction goes into its cache.
     """
-    heatmap = np.zeros_like(signal)
-    counts = np.zeros_like(signal)
+    window_sizes = np.atleast_1d(window_size).astype(int)
+    strides = np.broadcast_to(np.atleast_1d(stride), window_sizes.shape).astype(int)
+    length = len(signal)
 
-    # Base prediction probability for the target class
-    # Use batch prediction to speed up
-    # Create batch of occluded signals
-    occluded_batch = []
-    
-    # Base prediction
-    X_base = preprocess_signal(signal)
-    base_pred = model.predict(X_base, verbose=0)[0][target_class_idx]
-    
-    indices = []
-    for i in range(0, len(signal) - window_size, stride):
-        # Create occluded signal
-        occluded = signal.copy()
-        occluded[i : i + window_size] = 0  # Mask with zeros (baseline)
-        occluded_batch.append(preprocess_signal(occluded)[0])
-        indices.append(i)
-    
-    # Predict on batch
-    if occluded_batch:
-        X_batch = np.array(occluded_batch)
-        preds = model.predict(X_batch, verbose=0)
-        
-        for idx, i in enumerate(indices):
-            pred = preds[idx][target_class_idx]
-            importance = max(0, base_pred - pred)
-            heatmap[i : i + window_size] += importance
-            counts[i : i + window_size] += 1
+    masks = occlusion_masks(length, window_sizes, strides)
+
+    # Occlusions are applied to the padded/trimmed model input; masks past
+    # TARGET_LENGTH are truncated away (so they score zero importance).
+    base = preprocess_signal(signal)[0, :, 0].astype(np.float32)
+    model_masks = np.zeros((len(masks), TARGET_LENGTH), dtype=bool)
+    usable = min(length, TARGET_LENGTH)
+    model_masks[:, :usable] = masks[:, :usable]
+
+    # Row 0 is the unoccluded base prediction, rows 1.. are the occlusions
+    # (only the base row is worth caching)
+    batch = np.empty((len(masks) + 1, TARGET_LENGTH), dtype=np.float32)
+    batch[0] = base
+    np.multiply(base, ~model_masks, out=batch[1:])
+    preds = model.predict(batch[:, :, np.newaxis], cached_rows=1)[:, target_class_idx]
+
+    importance = np.maximum(0, preds[0] - preds[1:])
+
+    # Scatter-add every window's importance onto the samples it covered
+    heatmap = importance @ masks
+    counts = masks.sum(axis=0)
 
     # Average and normalize
-    safe_counts = np.maximum(counts, 1e-7)
-    heatmap = heatmap / safe_counts
-    
+    heatmap = heatmap / np.maximum(counts, 1e-7)
+
     # Min-max scaling
     h_min, h_max = np.min(heatmap), np.max(heatmap)
     if h_max > h_min:
         heatmap = (heatmap - h_min) / (h_max - h_min)
-    
+
     return heatmap.tolist()
 
 
-def extract_features(signal, fs=125):
+# ---------------------------------------------------------------------------
+# Explainability (gradient saliency – see explanation_utils.py)
+# ---------------------------------------------------------------------------
+EXPLAIN_METHODS = ("occlusion", "integrated_gradients", "gradient_x_input", "gradcam")
+
+_gradient_explainer = None
+
+
+def get_gradient_explainer():
+    global _gradient_explainer
+    if _gradient_explainer is None:
+        from explanation_utils import GradientExplainer
+
+        _gradient_explainer = GradientExplainer(get_model().keras_model())
+    return _gradient_explainer
+
+
+def explain_with_gradients(signal, target_class_idx, method):
+    """Gradient-based heatmap in the same format as explain_prediction()."""
+    window = preprocess_signal(signal)[0, :, 0]
+    heatmap = get_gradient_explainer().explain(window, target_class_idx, method)
+    # Map the model window back onto the submitted signal length
+    result = np.zeros(len(signal))
+    usable = min(len(signal), TARGET_LENGTH)
+    result[:usable] = heatmap[:usable]
+    return result.tolist()
+
+
+def compute_heatmap(signal, target_class_idx, method="occlusion"):
+    """Heatmap for one signal with any of EXPLAIN_METHODS."""
+    if method == "occlusion":
+        return explain_prediction(_predictor, signal, target_class_idx)
+    return explain_with_gradients(signal, target_class_idx, method)
+
+
+def extract_features(signal, fs=125, method="threshold"):
     """
-    Extract basic features from the ECG signal (R-peaks, RR intervals, Heart Rate).
-    Note: MIT-BIH is originally 360Hz, but if this is a snippet, we assume 
-    roughly 125Hz or resampled. We will use a simple heuristic.
+    Extract basic features from the ECG signal (R-peaks, RR intervals, Heart
+    Rate, HRV and QRS width) with the vectorized detector in ecg_features.py.
+    Note: MIT-BIH is originally 360Hz, but if this is a snippet, we assume
+    roughly 125Hz or resampled.
     """
-    # Simple R-peak detection based on threshold
-    # Normalize signal
-    sig_min, sig_max = np.min(signal), np.max(signal)
-    if sig_max - sig_min == 0:
-        return {"bpm": 0, "rr_avg": 0, "amplitude": 0}
-        
-    norm_signal = (signal - sig_min) / (sig_max - sig_min)
-    
-    # Threshold for R-peaks (e.g., 0.6)
-    peaks = []
-    threshold = 0.6
-    for i in range(1, len(norm_signal) - 1):
-        if norm_signal[i] > threshold and \
-           norm_signal[i] > norm_signal[i-1] and \
-           norm_signal[i] > norm_signal[i+1]:
-            # simple local max above threshold
-            if len(peaks) == 0 or (i - peaks[-1]) > (0.2 * fs): # refractory period ~200ms
-                peaks.append(i)
-                
-    features = {
-        "bpm": 0,
-        "rr_avg": 0,
-        "amplitude": round(sig_max - sig_min, 3),
-        "peak_count": len(peaks)
+    feats = ecg_features.compute_features(signal, fs=fs, method=method)
+    return {
+        "bpm": int(round(feats["bpm"])),
+        "rr_avg": int(round(feats["rr_avg_ms"])),  # ms
+        "amplitude": round(feats["amplitude"], 3),
+        "peak_count": len(feats["peaks"]),
+        "sdnn_ms": round(feats["sdnn_ms"], 1),
+        "rmssd_ms": round(feats["rmssd_ms"], 1),
+        "pnn50": round(feats["pnn50"], 1),
+        "qrs_width_ms": int(round(feats["qrs_width_ms"])),
     }
-    
-    if len(peaks) > 1:
-        rr_intervals = np.diff(peaks)
-        rr_avg_samples = np.mean(rr_intervals)
-        rr_avg_sec = rr_avg_samples / fs
-        bpm = 60.0 / rr_avg_sec if rr_avg_sec > 0 else 0
-        
-        features["bpm"] = int(round(bpm))
-        features["rr_avg"] = int(round(rr_avg_sec * 1000)) # ms
-        
-    return features
 
 
-@app.route("/api/explain", methods=["POST"])
-def explain():
-    """Explain a specific ECG prediction using occlusion sensitivity AND LLM text."""
-    model = get_model()
-    data = request.get_json()
+def prepare_explanation(data, method="occlusion"):
+    """
+    Validate an /api/explain body and build the LLM prompt (shared with the
+    ASGI app). Returns (job, None) or (None, (error message, status)).
+    """
+    if not isinstance(data, dict):
+        return None, ("Missing signal", 400)
     signal = data.get("signal")
-    if not signal:
-        return jsonify({"error": "Missing signal"}), 400
-        
+    if not signal and data.get("handle"):
+        # Row of a file stored with /api/uploads
+        rows, error = find_upload(data["handle"])
+        if error:
+            return None, error
+        row = int(data.get("row", 0))
+        if row < 0 or row >= len(rows):
+            return None, (f"Row {row} out of range. File has {len(rows)} rows.", 400)
+        signal = rows[row]
+    if signal is None or len(signal) == 0:
+        return None, ("Missing signal", 400)
+
     signal_arr = np.array(signal, dtype=np.float64)
     label_idx = int(data.get("label", 0))
-    
-    # 1. Visual Explanation (Heatmap)
-    heatmap = explain_prediction(model, signal_arr, label_idx)
-    
-    # 2. Textual Explanation (LLM)
-    # Extract features for context
-    feats = extract_features(signal_arr)
+    if method not in EXPLAIN_METHODS:
+        return None, (
+            f"Unknown method '{method}'. Choose one of: {', '.join(EXPLAIN_METHODS)}",
+            400,
+        )
+
+    # Extract features for context (bucketed, so similar beats share a
+    # cached answer)
+    feats = bucket_features(extract_features(signal_arr))
     
     beat_type = CLASS_MAPPING.get(label_idx, "Unknown")
     severity = CLASS_SEVERITY.get(label_idx, "unknown")
+    cache_key = _llm_cache.key("explain", beat_type, severity, feats)
     
     explanation_prompt = (
         f"Act as an expert cardiologist explaining an ECG finding to a patient. "
@@ -315,16 +483,60 @@ def explain():
         f"Keep the tone reassuring but clinical and precise. Use bullet points for clarity."
     )
     
-    explanation_text = get_llm_response(explanation_prompt)
+    job = {
+        "signal": signal_arr,
+        "label": label_idx,
+        "method": method,
+        "prompt": explanation_prompt,
+        "cache_key": cache_key,
+    }
+    return job, None
+
+
+@app.route("/api/explain", methods=["POST"])
+def explain():
+    """
+    Explain a specific ECG prediction with a heatmap AND LLM text.
+
+    `method` (query string or JSON) selects the heatmap: occlusion (default),
+    integrated_gradients, gradient_x_input or gradcam. With `?stream=true`
+    (or `Accept: text/event-stream`) the answer is sent as server-sent
+    events: `heatmap`, then one `token` per text piece, then `done`.
+    """
+    data = request.get_json(silent=True) or {}
+    method = request.args.get("method") or data.get("method") or "occlusion"
+    job, error = prepare_explanation(data, method)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    signal_arr, label_idx = job["signal"], job["label"]
+
+    # 1. Textual Explanation (LLM), requested first so the call is in flight
+    # while the heatmap is computed
+    if wants_event_stream():
+        # Text is forwarded token by token; the heatmap is sent first
+        tokens = stream_llm_answer(job["cache_key"], job["prompt"])
+
+        def events():
+            yield sse_event(
+                "heatmap",
+                {"heatmap": compute_heatmap(signal_arr, label_idx, method), "method": method},
+            )
+            for piece in tokens:
+                yield sse_event("token", {"text": piece})
+            yield sse_event("done", {})
+
+        return sse_response(events())
+
+    llm_future = start_llm_answer(job["cache_key"], job["prompt"])
+
+    # 2. Visual Explanation (Heatmap)
+    heatmap = compute_heatmap(signal_arr, label_idx, method)
+
+    explanation_text = _llm_client.result(llm_future)
 
-    # Cleanup
-    if "model" in locals():
-        del model
-    tf.keras.backend.clear_session()
-    gc.collect()
-    
     return jsonify({
         "heatmap": heatmap,
+        "method": method,
         "explanation_text": explanation_text
     })
 
@@ -334,263 +546,816 @@ def explain():
 # ---------------------------------------------------------------------------
 @app.route("/api/health", methods=["GET"])
 def health():
+    """Liveness: the process is up (the model may still be loading)."""
     return jsonify({"status": "healthy", "model_accuracy": MODEL_ACCURACY})
 
 
+@app.route("/api/ready", methods=["GET"])
+def readiness():
+    """Readiness: 200 once predictions are served without loading the model."""
+    ready = model_ready()
+    backend = _model_manager.backend.name if _inference_pool is None else "inference_pool"
+    body = {"ready": ready, "backend": backend, "model_loaded": _model_manager.ready}
+    if _model_load_error and not ready:
+        body["error"] = _model_load_error
+    return jsonify(body), 200 if ready else 503
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    return jsonify(
+        {
+            "prediction_cache": _prediction_cache.stats(),
+            "llm_cache": _llm_cache.stats(),
+        }
+    )
+
+
 
 # ---------------------------------------------------------------------------
-# Image Digitizer Integration
+# Image Digitizer Integration (digitizer.py pulls in OpenCV, imported on first use)
 # ---------------------------------------------------------------------------
-import digitizer
+def image_lead_result(raw_signal, probs):
+    """Prediction fields for one digitized lead."""
+    label_idx = int(np.argmax(probs))
+    sqi_quality, snr = signal_quality(raw_signal)
+    return {
+        "label": label_idx,
+        "beat_type": CLASS_MAPPING[label_idx],
+        "description": CLASS_DESCRIPTIONS[label_idx],
+        "severity": CLASS_SEVERITY[label_idx],
+        "confidence": round(float(np.max(probs)) * 100, 2),
+        "signal": raw_signal.tolist(),
+        "sqi_quality": sqi_quality,
+        "snr_value": round(snr, 2),
+        "model_accuracy": MODEL_ACCURACY,
+        "probabilities": {
+            CLASS_MAPPING[i]: round(float(p) * 100, 2) for i, p in enumerate(probs)
+        },
+    }
+
 
 @app.route("/api/predict/image", methods=["POST"])
 def predict_image():
-    """Extract signal from ECG image and predict."""
+    """
+    Extract signal from ECG image and predict.
+
+    Multi-lead printouts: `n_leads` strips ("auto" to detect them) and the
+    `lead` index to classify, or `lead=all` for a `leads` list with one
+    result per strip that has a trace.
+    """
     if "file" not in request.files:
         return jsonify({"error": "No image file uploaded"}), 400
-        
+
     file = request.files["file"]
     try:
-        # Extract signal using digitizer
-        raw_signal = digitizer.process_image(file.stream)
-        
-        # Preprocess and Predict
-        model = get_model()
-        X = preprocess_signal(raw_signal)
-        predictions = model.predict(X)
-        
-        label_idx = int(np.argmax(predictions, axis=1)[0])
-        confidence = float(np.max(predictions[0]) * 100)
-        
-        # Calculate SQI
-        smoothed = np.convolve(raw_signal, np.ones(5)/5, mode='same')
-        noise = raw_signal - smoothed
-        snr = np.std(raw_signal) / (np.std(noise) + 1e-6)
-        
-        sqi_quality = "Good"
-        if snr < 2.0: sqi_quality = "Poor"
-        elif snr < 5.0: sqi_quality = "Fair"
-
-        # Cleanup
-        if "model" in locals(): del model
-        tf.keras.backend.clear_session()
-        gc.collect()
-
-        return jsonify({
-            "label": label_idx,
-            "beat_type": CLASS_MAPPING[label_idx],
-            "description": CLASS_DESCRIPTIONS[label_idx],
-            "severity": CLASS_SEVERITY[label_idx],
-            "confidence": round(confidence, 2),
-            "signal": raw_signal.tolist(),
-            "sqi_quality": sqi_quality,
-            "snr_value": round(snr, 2),
-            "model_accuracy": MODEL_ACCURACY,
-            "probabilities": {
-                CLASS_MAPPING[i]: round(float(p) * 100, 2)
-                for i, p in enumerate(predictions[0])
-            },
-        })
+        n_leads = request.form.get("n_leads", "1")
+        n_leads = None if n_leads == "auto" else int(n_leads)
+        lead = request.form.get("lead", "0")
+        lead = None if lead == "all" else int(lead)
+    except ValueError:
+        return jsonify(
+            {"error": "n_leads must be an integer or 'auto', lead an integer or 'all'"}
+        ), 400
+    if n_leads is not None and n_leads < 1:
+        return jsonify({"error": "n_leads must be at least 1"}), 400
+    remove_grid = request.form.get("remove_grid", "true").lower() == "true"
 
+    # Extract signal using digitizer
+    import digitizer
+
+    try:
+        if lead is None:
+            leads = digitizer.extract_leads(file.stream, n_leads=n_leads, remove_grid=remove_grid)
+        else:
+            leads = [(lead, digitizer.process_image(
+                file.stream, lead=lead, n_leads=n_leads, remove_grid=remove_grid
+            ))]
+    except ValueError as e:  # undecodable image, no trace, lead out of range
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Image processing failed: {str(e)}"}), 500
 
+    try:
+        # Preprocess and predict every lead in one batch
+        X = np.concatenate([preprocess_signal(raw_signal) for _, raw_signal in leads])
+        predictions = _predictor.predict(X)
+        results = [
+            dict(image_lead_result(raw_signal, probs), lead=index)
+            for (index, raw_signal), probs in zip(leads, predictions)
+        ]
+    except Exception as e:
+        return jsonify({"error": f"Image processing failed: {str(e)}"}), 500
 
-@app.route("/api/predict", methods=["POST"])
-def predict():
-    """
-    Accept ECG data and return arrhythmia prediction.
+    if lead is None:
+        return jsonify({"leads": results})
+    return jsonify(results[0])
 
-    Supports two modes:
-      1. JSON body with `signal` (array of numbers)
-      2. CSV file upload with optional `row` parameter
-    """
-    model = get_model()
 
-    # --- Mode 1: JSON signal array ------------------------------------
-    if request.is_json:
-        data = request.get_json()
-        signal = data.get("signal")
-        if signal is None:
-            return jsonify({"error": "Missing 'signal' field"}), 400
-        raw = np.array(signal, dtype=np.float64)
-        X = preprocess_signal(raw)
-        predictions = model.predict(X)
-        label_idx = int(np.argmax(predictions, axis=1)[0])
-        confidence = float(np.max(predictions[0]) * 100)
+# ---------------------------------------------------------------------------
+# Upload-once CSV storage (see upload_store.py)
+# ---------------------------------------------------------------------------
+_upload_store = UploadStore()
 
-        # Cleanup Memory
-        if "model" in locals():
-            del model
-        tf.keras.backend.clear_session()
-        gc.collect()
 
-        return jsonify(
-            {
-                "label": label_idx,
-                "beat_type": CLASS_MAPPING[label_idx],
-                "description": CLASS_DESCRIPTIONS[label_idx],
-                "severity": CLASS_SEVERITY[label_idx],
-                "confidence": round(confidence, 2),
-                "signal": raw.tolist(),
-                "model_accuracy": MODEL_ACCURACY,
-                "probabilities": {
-                    CLASS_MAPPING[i]: round(float(p) * 100, 2)
-                    for i, p in enumerate(predictions[0])
-                },
-            }
-        )
+def request_param(name, default=None):
+    """Look a parameter up in the JSON body, then form fields, then query string."""
+    data = request.get_json(silent=True) if request.is_json else None
+    if isinstance(data, dict) and data.get(name) is not None:
+        return data[name]
+    return request.form.get(name, request.args.get(name, default))
 
-    # --- Mode 2: CSV file upload --------------------------------------
-    if "file" not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
 
-    file = request.files["file"]
-    row = int(request.form.get("row", 0))
+def wants_signal_echo() -> bool:
+    """`echo_signal` from the JSON body, form or query string (default true)."""
+    value = request_param("echo_signal")
+    if value is None:
+        return True
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() not in ("false", "0", "no")
 
+
+def get_upload_rows(handle):
+    """Stored rows for an upload handle, or None if it is unknown/expired."""
+    try:
+        return _upload_store.get(handle)
+    except KeyError:
+        return None
+
+
+def find_upload(handle):
+    """(rows, None) for an upload handle, or (None, (error message, status))."""
+    if not isinstance(handle, str):
+        return None, ("Upload handle must be a string", 400)
+    rows = get_upload_rows(handle)
+    if rows is None:
+        return None, ("Unknown or expired upload handle", 404)
+    return rows, None
+
+
+@app.route("/api/uploads", methods=["POST"])
+def create_upload():
+    """
+    Parse a CSV upload once and keep it server-side as a memory-mapped array.
+    The returned `handle` can be passed to /api/predict, /api/predict/batch
+    and /api/explain instead of re-uploading the file.
+    """
+    if "file" not in request.files:
+        return jsonify({"error": "No file uploaded"}), 400
+    too_large = {"error": f"Uploads are limited to {_upload_store.max_bytes} bytes"}
+    if _upload_store.max_bytes and (request.content_length or 0) > _upload_store.max_bytes:
+        return jsonify(too_large), 413
     try:
-        content = file.read().decode("utf-8")
-        df = pd.read_csv(io.StringIO(content), header=None)
+        handle, rows = _upload_store.add(request.files["file"].stream)
+    except UploadTooLarge:
+        return jsonify(too_large), 413
     except Exception as e:
         return jsonify({"error": f"Failed to parse CSV: {str(e)}"}), 400
+    return jsonify(
+        {"handle": handle, "total_rows": int(rows.shape[0]), "n_cols": int(rows.shape[1])}
+    ), 201
 
-    if row < 0 or row >= len(df):
-        return jsonify(
-            {"error": f"Row {row} out of range. File has {len(df)} rows."}
-        ), 400
 
-    # Extract 186 columns (the model input)
-    raw = df.iloc[row, :TARGET_LENGTH].values.astype(np.float64)
+@app.route("/api/uploads/<handle>", methods=["GET"])
+def get_upload(handle):
+    rows = get_upload_rows(handle)
+    if rows is None:
+        return jsonify({"error": "Unknown or expired upload handle"}), 404
+    return jsonify(
+        {"handle": handle, "total_rows": int(rows.shape[0]), "n_cols": int(rows.shape[1])}
+    )
+
+
+def row_prediction_result(raw, row, total_rows):
+    """Prediction response for one row of a CSV file (uploaded or stored)."""
     X = preprocess_signal(raw)
 
-    predictions = model.predict(X)
+    predictions = predict_beat(X)
     label_idx = int(np.argmax(predictions, axis=1)[0])
     confidence = float(np.max(predictions[0]) * 100)
 
     # Calculate SQI (Signal Quality Index) using SNR approximation
-    smoothed = np.convolve(raw, np.ones(5)/5, mode='same')
-    noise = raw - smoothed
-    snr = np.std(raw) / (np.std(noise) + 1e-6)
-    
-    sqi_quality = "Good"
-    if snr < 2.0:
-        sqi_quality = "Poor"
-    elif snr < 5.0:
-        sqi_quality = "Fair"
+    sqi_quality, snr = signal_quality(raw)
+
+    result = {
+        "label": label_idx,
+        "beat_type": CLASS_MAPPING[label_idx],
+        "description": CLASS_DESCRIPTIONS[label_idx],
+        "severity": CLASS_SEVERITY[label_idx],
+        "confidence": round(confidence, 2),
+        "total_rows": total_rows,
+        "analyzed_row": row,
+        "sqi_quality": sqi_quality,
+        "snr_value": round(snr, 2),
+        "model_accuracy": MODEL_ACCURACY,
+        "probabilities": {
+            CLASS_MAPPING[i]: round(float(p) * 100, 2)
+            for i, p in enumerate(predictions[0])
+        },
+    }
+    if wants_signal_echo():
+        result["signal"] = raw.tolist()
+    return result
+
+
+def batch_results(block, first_row, chunk_size):
+    """Per-row results for a 2-D block of rows starting at `first_row`."""
+    X = preprocess_batch(block, out=batch_buffer(len(block)))
+    predictions = _predictor.predict(X, batch_size=chunk_size)
+    label_idxs = np.argmax(predictions, axis=1)
+    confidences = np.max(predictions, axis=1) * 100
+    return [
+        {
+            "row": first_row + i,
+            "label": int(label_idx),
+            "beat_type": CLASS_MAPPING[int(label_idx)],
+            "severity": CLASS_SEVERITY[int(label_idx)],
+            "confidence": round(float(confidence), 2),
+        }
+        for i, (label_idx, confidence) in enumerate(zip(label_idxs, confidences))
+    ]
+
+
+@app.route("/api/predict", methods=["POST"])
+def predict():
+    """
+    Accept ECG data and return arrhythmia prediction.
 
-    # Capture metrics before cleanup
-    total_rows = len(df)
+    Supports two modes:
+      1. JSON body with `signal` (array of numbers), or a binary body:
+         raw little-endian float32/int16 (`application/octet-stream`, with
+         `?dtype=int16&gain=..&offset=..`) or a `.npy` file (`application/x-npy`)
+      2. CSV file upload with optional `row` parameter
+      3. `handle` of a file stored with /api/uploads, plus `row`
 
-    # Cleanup Memory
-    if "model" in locals():
-        del model
-    if "df" in locals():
-        del df
-    tf.keras.backend.clear_session()
-    gc.collect()
+    Pass `echo_signal=false` (query string, form field or JSON) to leave the
+    input signal out of the response. JSON and binary signals may give their
+    sampling rate as `fs` (default 125 Hz).
+    """
+    # --- Previously uploaded CSV (handle from /api/uploads) -----------
+    handle = request_param("handle")
+    if handle:
+        rows, error = find_upload(handle)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        row = int(request_param("row", 0))
+        if row < 0 or row >= len(rows):
+            return jsonify(
+                {"error": f"Row {row} out of range. File has {len(rows)} rows."}
+            ), 400
+        raw = np.asarray(rows[row], dtype=np.float64)
+        return jsonify(row_prediction_result(raw, row, len(rows)))
+
+    # --- Mode 1: JSON signal array or binary body ---------------------
+    if request.is_json or request.mimetype in BINARY_MIMETYPES:
+        if request.is_json:
+            data = request.get_json()
+            signal = data.get("signal")
+            if signal is None:
+                return jsonify({"error": "Missing 'signal' field"}), 400
+            raw = np.array(signal, dtype=np.float64)
+            echo = wants_signal_echo()
+        else:
+            try:
+                raw = decode_binary_signal(
+                    request.get_data(cache=False),
+                    request.mimetype,
+                    dtype=request.args.get("dtype", "float32"),
+                    gain=float(request.args.get("gain", 1.0)),
+                    offset=float(request.args.get("offset", 0.0)),
+                )
+            except ValueError as e:
+                return jsonify({"error": f"Invalid binary signal: {str(e)}"}), 400
+            echo = wants_signal_echo()
+
+        # Signals recorded at another rate are resampled to 125 Hz
+        try:
+            fs = float(request_param("fs", TARGET_FS))
+        except (TypeError, ValueError):
+            return jsonify({"error": "fs must be a number"}), 400
+        if fs <= 0:
+            return jsonify({"error": "fs must be positive"}), 400
+
+        X = preprocess_signal(raw, fs=fs)
+        predictions = predict_beat(X)
+        label_idx = int(np.argmax(predictions, axis=1)[0])
+        confidence = float(np.max(predictions[0]) * 100)
 
-    return jsonify(
-        {
+        result = {
             "label": label_idx,
             "beat_type": CLASS_MAPPING[label_idx],
             "description": CLASS_DESCRIPTIONS[label_idx],
             "severity": CLASS_SEVERITY[label_idx],
             "confidence": round(confidence, 2),
-            "signal": raw.tolist(),
-            "total_rows": total_rows,
-            "analyzed_row": row,
-            "sqi_quality": sqi_quality,
-            "snr_value": round(snr, 2),
             "model_accuracy": MODEL_ACCURACY,
             "probabilities": {
                 CLASS_MAPPING[i]: round(float(p) * 100, 2)
                 for i, p in enumerate(predictions[0])
             },
         }
-    )
-
-
-@app.route("/api/predict/batch", methods=["POST"])
-def predict_batch():
-    """Predict multiple rows from a CSV upload."""
-    model = get_model()
+        if echo:
+            result["signal"] = raw.tolist()
+        return jsonify(result)
 
+    # --- Mode 2: CSV file upload --------------------------------------
     if "file" not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
 
     file = request.files["file"]
-    start_row = int(request.form.get("start_row", 0))
-    end_row = int(request.form.get("end_row", -1))
+    row = int(request.form.get("row", 0))
 
+    # Stream the upload and only parse the requested row (186 model columns);
+    # a negative row selects nothing, but the rows are still counted
     try:
-        content = file.read().decode("utf-8")
-        df = pd.read_csv(io.StringIO(content), header=None)
+        raw, total_rows = read_csv_row(file.stream, row, TARGET_LENGTH)
     except Exception as e:
         return jsonify({"error": f"Failed to parse CSV: {str(e)}"}), 400
 
-    if end_row == -1 or end_row >= len(df):
-        end_row = len(df) - 1
+    if raw is None:
+        return jsonify(
+            {"error": f"Row {row} out of range. File has {total_rows} rows."}
+        ), 400
 
-    results = []
-    for row in range(start_row, end_row + 1):
-        raw = df.iloc[row, :TARGET_LENGTH].values.astype(np.float64)
-        X = preprocess_signal(raw)
-        predictions = model.predict(X, verbose=0)
-        label_idx = int(np.argmax(predictions, axis=1)[0])
-        confidence = float(np.max(predictions[0]) * 100)
-        results.append(
+    return jsonify(row_prediction_result(raw, row, total_rows))
+
+
+@app.route("/api/predict/batch", methods=["POST"])
+def predict_batch():
+    """Predict multiple rows from a CSV upload or a stored upload `handle`."""
+    handle = request_param("handle")
+    if not handle and "file" not in request.files:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    start_row = int(request_param("start_row", 0))
+    end_row = int(request_param("end_row", -1))
+    chunk_size = int(request_param("chunk_size", BATCH_CHUNK_SIZE))
+    if chunk_size <= 0:
+        return jsonify({"error": "chunk_size must be positive"}), 400
+    if start_row < 0:
+        return jsonify({"error": f"Invalid start_row {start_row}."}), 400
+
+    # Stored upload: slice the memory-mapped rows directly
+    if handle:
+        rows, error = find_upload(handle)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        total_rows = len(rows)
+        if end_row == -1 or end_row >= total_rows:
+            end_row = total_rows - 1
+        if start_row > end_row:
+            return jsonify(
+                {"error": f"Invalid row range [{start_row}, {end_row}]. File has {total_rows} rows."}
+            ), 400
+        results = []
+        for first_row in range(start_row, end_row + 1, chunk_size):
+            block = rows[first_row : min(first_row + chunk_size, end_row + 1)]
+            results.extend(batch_results(block, first_row, chunk_size))
+        return jsonify(
             {
-                "row": row,
-                "label": label_idx,
-                "beat_type": CLASS_MAPPING[label_idx],
-                "severity": CLASS_SEVERITY[label_idx],
-                "confidence": round(confidence, 2),
+                "results": results,
+                "total_rows": total_rows,
+                "analyzed_range": [start_row, end_row],
+                "model_accuracy": MODEL_ACCURACY,
             }
         )
 
+    file = request.files["file"]
+
+    # Stream the upload: each parsed block of rows goes straight to the model
+    reader = CsvRowReader(
+        file.stream,
+        start_row=start_row,
+        end_row=None if end_row == -1 else end_row,
+        n_cols=TARGET_LENGTH,
+        block_rows=chunk_size,
+    )
+    results = []
+    try:
+        for first_row, block in reader:
+            results.extend(batch_results(block, first_row, chunk_size))
+    except Exception as e:
+        return jsonify({"error": f"Failed to parse CSV: {str(e)}"}), 400
+
+    total_rows = reader.total_rows
+    if end_row == -1 or end_row >= total_rows:
+        end_row = total_rows - 1
+    if start_row > end_row:
+        return jsonify(
+            {"error": f"Invalid row range [{start_row}, {end_row}]. File has {total_rows} rows."}
+        ), 400
+
     return jsonify(
         {
             "results": results,
-            "total_rows": len(df),
+            "total_rows": total_rows,
             "analyzed_range": [start_row, end_row],
             "model_accuracy": MODEL_ACCURACY,
         }
     )
 
 
+# ---------------------------------------------------------------------------
+# Streaming long-record classification
+# ---------------------------------------------------------------------------
+STREAM_READ_BYTES = 64 * 1024
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", 256))
+
+
+def iter_binary_samples(stream, dtype="float32", gain=1.0, offset=0.0,
+                        chunk_bytes=STREAM_READ_BYTES):
+    """Yield float32 chunks from a raw little-endian float32/int16 byte stream."""
+    if dtype not in BINARY_DTYPES:
+        raise ValueError(f"Unsupported dtype '{dtype}'")
+    np_dtype = BINARY_DTYPES[dtype]
+    leftover = b""
+    while True:
+        data = stream.read(chunk_bytes)
+        if not data:
+            break
+        data = leftover + data
+        usable = len(data) - len(data) % np_dtype.itemsize
+        leftover = data[usable:]
+        if usable:
+            yield scale_samples(np.frombuffer(data[:usable], dtype=np_dtype), gain, offset)
+
+
+def iter_csv_samples(stream, column=0, chunk_rows=16384):
+    """Yield float32 chunks of one CSV column, parsed a block at a time."""
+    import pandas as pd
+
+    reader = pd.read_csv(
+        stream, header=None, usecols=[column], chunksize=chunk_rows,
+        dtype={column: str},
+    )
+    try:
+        for chunk in reader:
+            # Non-numeric cells (e.g. a header row) become NaN and are dropped
+            values = pd.to_numeric(chunk[column], errors="coerce").to_numpy(np.float32)
+            values = values[~np.isnan(values)]
+            if len(values):
+                yield values
+    finally:
+        stream.close()
+
+
+def iter_request_samples():
+    """Pick the sample source for /api/predict/stream from the request."""
+    if request.is_json:
+        data = request.get_json()
+        signal = data.get("signal") if isinstance(data, dict) else data
+        if signal is None:
+            raise ValueError("Missing 'signal' field")
+        return iter([np.asarray(signal, dtype=np.float32)])
+
+    column = int(request.args.get("column", 0))
+    if "file" in request.files:
+        # Flask closes uploaded files before a streamed response is consumed,
+        # so copy the upload to a temp file (in chunks) and read from that.
+        spooled = tempfile.TemporaryFile()
+        request.files["file"].save(spooled)
+        spooled.seek(0)
+        return iter_csv_samples(spooled, column)
+    if request.mimetype in ("text/csv", "text/plain"):
+        return iter_csv_samples(request.stream, column)
+    if request.mimetype == RAW_MIMETYPE:
+        return iter_binary_samples(
+            request.stream,
+            dtype=request.args.get("dtype", "float32"),
+            gain=float(request.args.get("gain", 1.0)),
+            offset=float(request.args.get("offset", 0.0)),
+        )
+    raise ValueError(
+        "Send a JSON array, a CSV file/body, or a raw float32 "
+        "(application/octet-stream) body"
+    )
+
+
+@app.route("/api/predict/stream", methods=["POST"])
+def predict_stream():
+    """
+    Classify every beat of a long ECG record and stream results as NDJSON.
+
+    The record is read incrementally, R-peaks are detected on the fly and
+    each beat window is classified in batches, so memory use does not grow
+    with the length of the recording. Query parameters: `fs` (sampling
+    rate, default 125; beat windows are resampled to 125 Hz), `align`
+    (start/center), `column` (CSV column) and `batch_size`.
+    """
+    try:
+        fs = float(request.args.get("fs", 125))
+        batch_size = int(request.args.get("batch_size", STREAM_BATCH_SIZE))
+        segmenter = StreamingBeatSegmenter(
+            fs=fs, align=request.args.get("align", "start")
+        )
+        chunks = iter_request_samples()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def classify(beats, counts):
+        peaks = [peak for peak, _ in beats]
+        X = np.stack([window for _, window in beats])[:, :, np.newaxis]
+        predictions = model_predict(X)
+        for n, (peak, probs) in enumerate(zip(peaks, predictions)):
+            label_idx = int(np.argmax(probs))
+            counts[label_idx] += 1
+            yield json.dumps(
+                {
+                    "beat": counts["total"] + n,
+                    "sample": peak,
+                    "time_s": round(peak / fs, 3),
+                    "label": label_idx,
+                    "beat_type": CLASS_MAPPING[label_idx],
+                    "severity": CLASS_SEVERITY[label_idx],
+                    "confidence": round(float(probs[label_idx]) * 100, 2),
+                }
+            ) + "\n"
+        counts["total"] += len(beats)
+
+    def generate():
+        counts = {idx: 0 for idx in CLASS_MAPPING}
+        counts["total"] = 0
+        pending = []
+        try:
+            for chunk in chunks:
+                pending.extend(segmenter.feed(chunk))
+                while len(pending) >= batch_size:
+                    yield from classify(pending[:batch_size], counts)
+                    pending = pending[batch_size:]
+            pending.extend(segmenter.flush())
+            if pending:
+                yield from classify(pending, counts)
+        except Exception as e:
+            yield json.dumps({"error": f"Stream processing failed: {str(e)}"}) + "\n"
+            return
+
+        yield json.dumps(
+            {
+                "summary": {
+                    "total_beats": counts["total"],
+                    "total_samples": segmenter.samples_seen,
+                    "duration_s": round(segmenter.samples_seen / fs, 3),
+                    "beat_counts": {
+                        CLASS_MAPPING[idx]: counts[idx] for idx in CLASS_MAPPING
+                    },
+                }
+            }
+        ) + "\n"
+
+    return Response(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
+
+
+@app.route("/api/rhythm", methods=["POST"])
+def rhythm():
+    """
+    Rhythm analysis of a long ECG record, streamed back as NDJSON.
+
+    Beats are detected and classified as in /api/predict/stream, annotated
+    with their RR interval and grouped into episodes (couplets, runs,
+    bigeminy, trigeminy, tachycardia, bradycardia – see rhythm.py), plus a
+    sliding rhythm window. Query parameters: `fs`, `align`, `column`,
+    `window_s` and `hop_s` (rhythm window length and step) and `beats=false`
+    to leave out the per-beat lines.
+    """
+    try:
+        analyzer = RhythmAnalyzer(
+            model_predict,
+            fs=float(request.args.get("fs", 125)),
+            align=request.args.get("align", "start"),
+            window_seconds=float(request.args.get("window_s", RHYTHM_WINDOW_SECONDS)),
+            hop_seconds=float(request.args.get("hop_s", RHYTHM_HOP_SECONDS)),
+            class_names=[CLASS_MAPPING[idx] for idx in sorted(CLASS_MAPPING)],
+            emit_beats=request.args.get("beats", "true").lower() != "false",
+        )
+        chunks = iter_request_samples()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        try:
+            for chunk in chunks:
+                for event in analyzer.append(chunk):
+                    yield json.dumps(event) + "\n"
+            for event in analyzer.finish():
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": f"Rhythm analysis failed: {str(e)}"}) + "\n"
+            return
+        yield json.dumps({"summary": analyzer.summary()}) + "\n"
+
+    return Response(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
+
+
+# ---------------------------------------------------------------------------
+# PDF reports (report_generator.py pulls in matplotlib and reportlab,
+# imported on first use)
+# ---------------------------------------------------------------------------
+
+def build_report_items(beats):
+    """
+    Fill in prediction fields for report beats. Beats that already carry a
+    `beat_type` are used as-is; the rest are classified in one model call.
+    """
+    items = []
+    to_predict = []
+    for beat in beats:
+        if not isinstance(beat, dict) or beat.get("signal") is None:
+            raise ValueError("Each beat needs a 'signal' array")
+        raw = np.asarray(beat["signal"], dtype=np.float64)
+        item = dict(beat, signal=raw.tolist())
+        if "sqi_quality" not in item:
+            item["sqi_quality"] = signal_quality(raw)[0]
+        if "beat_type" not in item:
+            to_predict.append((item, raw))
+        items.append(item)
+
+    if to_predict:
+        X = np.concatenate([preprocess_signal(raw) for _, raw in to_predict])
+        predictions = _predictor.predict(X)
+        for (item, _), probs in zip(to_predict, predictions):
+            label_idx = int(np.argmax(probs))
+            item.update(
+                {
+                    "label": label_idx,
+                    "beat_type": CLASS_MAPPING[label_idx],
+                    "description": CLASS_DESCRIPTIONS[label_idx],
+                    "severity": CLASS_SEVERITY[label_idx],
+                    "confidence": round(float(probs[label_idx]) * 100, 2),
+                }
+            )
+    return items
+
+
+@app.route("/api/report", methods=["POST"])
+def report():
+    """
+    Generate a PDF analysis report.
+
+    JSON body with `signal` (plus optional precomputed result fields) returns
+    one PDF; `beats` (a list of such objects) returns a ZIP with one PDF per
+    beat, rendered in parallel worker processes.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or ("signal" not in data and "beats" not in data):
+        return jsonify({"error": "Send a 'signal' array or a 'beats' list"}), 400
+
+    try:
+        import report_generator
+
+        if "beats" in data:
+            items = build_report_items(data["beats"])
+            archive = report_generator.generate_report_archive(items)
+            return send_file(
+                archive,
+                mimetype="application/zip",
+                as_attachment=True,
+                download_name="cardioscan_reports.zip",
+            )
+
+        item = build_report_items([data])[0]
+        pdf = report_generator.generate_pdf_report(item)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Report generation failed: {str(e)}"}), 500
+
+    return send_file(
+        pdf,
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name="cardioscan_report.pdf",
+    )
+
+
+# ---------------------------------------------------------------------------
+# Sample dataset (see sample_store.py), converted and memory-mapped at startup
+# ---------------------------------------------------------------------------
+SAMPLE_PAGE_LIMIT = int(os.environ.get("SAMPLE_PAGE_LIMIT", 100))
+
+_samples = SampleDataset()
+if __name__ != "__mp_main__" and _samples.available:
+    _samples.load()
+
+
+def parse_sample_label(value):
+    """Class filter from `?label=`: an index or a class name; None if absent."""
+    if value is None or value == "":
+        return None
+    if value.lstrip("-").isdigit():
+        return int(value)
+    for idx, name in CLASS_MAPPING.items():
+        if name.lower() == value.lower():
+            return idx
+    raise ValueError(f"Unknown label '{value}'")
+
+
+def sample_item(row):
+    raw, label = _samples.get(row)
+    item = {"signal": raw.tolist(), "row": row}
+    if label != NO_LABEL:
+        item["label"] = label
+        item["beat_type"] = CLASS_MAPPING.get(label, "Unknown")
+    return item
+
+
+def int_arg(name, default=None):
+    """Integer query parameter; ValueError if it is given but not an integer."""
+    value = request.args.get(name, type=int)
+    if value is None:
+        if name in request.args:
+            raise ValueError(f"{name} must be an integer")
+        return default
+    return value
+
+
 @app.route("/api/sample", methods=["GET"])
 def sample_data():
-    """Return a sample ECG signal for demo/testing purposes."""
-    sample_path = os.path.join(os.path.dirname(__file__), "sample.csv")
-    if not os.path.exists(sample_path):
+    """
+    Return a sample ECG signal for demo/testing purposes.
+
+    Query parameters:
+      - row: index of the sample (out-of-range falls back to 0)
+      - random=true: pick a random sample instead
+      - label: only consider one class (index or name); `row`/`offset`
+        then count within that class
+      - offset + limit: return a page of samples under `items`
+    """
+    if not _samples.available:
         return jsonify({"error": "Sample data not available"}), 404
 
-    df = pd.read_csv(sample_path, header=None)
-    row = int(request.args.get("row", 0))
-    if row >= len(df):
-        row = 0
+    try:
+        label = parse_sample_label(request.args.get("label"))
+        index = int_arg("row", 0)
+        offset = int_arg("offset", 0)
+        limit = int_arg("limit")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    total_rows = _samples.count(label)
+    if total_rows == 0:
+        return jsonify({"error": "No samples for this label"}), 404
+
+    # Paging
+    if limit is not None:
+        offset = max(offset, 0)
+        limit = min(max(limit, 0), SAMPLE_PAGE_LIMIT)
+        stop = min(offset + limit, total_rows)
+        items = [sample_item(_samples.resolve(i, label)) for i in range(offset, stop)]
+        return jsonify(
+            {
+                "items": items,
+                "total_rows": total_rows,
+                "offset": offset,
+                "limit": limit,
+            }
+        )
 
-    raw = df.iloc[row, :TARGET_LENGTH].values.astype(np.float64)
-    return jsonify(
-        {
-            "signal": raw.tolist(),
-            "total_rows": len(df),
-            "row": row,
-        }
-    )
+    if request.args.get("random", "false").lower() in ("true", "1", "yes"):
+        row = _samples.random_row(label)
+    else:
+        if index < 0 or index >= total_rows:
+            index = 0
+        row = _samples.resolve(index, label)
+
+    result = sample_item(row)
+    result["total_rows"] = total_rows
+    return jsonify(result)
+
+
+def prepare_chat(data):
+    """(message, bucketed context, cache key) for a chat request body."""
+    user_message = data["message"]
+    context = bucket_context(data.get("context"))
+    cache_key = _llm_cache.key("chat", normalize_question(user_message), context)
+    return user_message, context, cache_key
 
 
 @app.route("/api/chat", methods=["POST"])
 def chat():
-    """LLM-powered chat endpoint for ECG-related questions."""
+    """
+    LLM-powered chat endpoint for ECG-related questions. With `?stream=true`
+    (or `Accept: text/event-stream`) tokens are sent as server-sent events.
+    """
     data = request.get_json()
     if not data or "message" not in data:
         return jsonify({"error": "Missing 'message' field"}), 400
 
-    user_message = data["message"]
-    context = data.get("context")
+    user_message, context, cache_key = prepare_chat(data)
+
+    if wants_event_stream():
+        tokens = stream_llm_answer(cache_key, user_message, context)
+
+        def events():
+            for piece in tokens:
+                yield sse_event("token", {"text": piece})
+            yield sse_event("done", {})
 
-    response_text = get_llm_response(user_message, context)
+        return sse_response(events())
+
+    response_text = _llm_client.result(start_llm_answer(cache_key, user_message, context))
     return jsonify({"response": response_text})
 
 
@@ -616,4 +1381,12 @@ def get_classes():
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("FLASK_DEBUG", "false").lower() == "true"
-    app.run(host="0.0.0.0", port=port, debug=debug)
+    pool = None
+    # The debug reloader runs this block twice; start replicas in the child only
+    if _inference_pool is not None and (not debug or os.environ.get("WERKZEUG_RUN_MAIN")):
+        pool = InferencePool().start()
+    try:
+        app.run(host="0.0.0.0", port=port, debug=debug)
+    finally:
+        if pool is not None:
+            pool.stop()
@@ -0,0 +1,257 @@
+"""
+ASGI entry point for the backend:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker --workers 2
+
+The LLM-bound routes (/api/chat and /api/explain) run natively on the event
+loop: LLM calls are awaited, so hundreds of them can wait at once without
+holding a thread, and the heatmap runs on a bounded CPU pool. Every other
+route is the unchanged Flask app, served from a bounded WSGI thread pool.
+Live ECG streams (/ws/live/<patient_id>) are only available here.
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+import app as backend
+from live import LIVE_IDLE_TIMEOUT, LiveSession, SessionRegistry
+from llm_client import is_error_text
+from model_manager import available_cpus
+
+ASGI_CPU_WORKERS = int(os.environ.get("ASGI_CPU_WORKERS", available_cpus()))
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 16))
+
+_cpu_pool = ThreadPoolExecutor(max_workers=ASGI_CPU_WORKERS, thread_name_prefix="asgi-cpu")
+
+
+def run_cpu(fn, *args):
+    """Run model/feature work on the bounded CPU pool; returns an awaitable."""
+    return asyncio.get_running_loop().run_in_executor(_cpu_pool, fn, *args)
+
+
+def wants_event_stream(request) -> bool:
+    if request.query_params.get("stream", "").lower() in ("true", "1", "yes"):
+        return True
+    # Same rule as the Flask app, on the same werkzeug Accept parser
+    accept = parse_accept_header(request.headers.get("accept"), MIMEAccept)
+    return backend.prefers_event_stream(accept)
+
+
+def sse_event(event, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def astream_llm_answer(cache_key, user_message, context=None):
+    """Async counterpart of app.stream_llm_answer (same cache)."""
+    cached = backend._llm_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    pieces = []
+    async for piece in backend._llm_client.astream(user_message, context):
+        pieces.append(piece)
+        yield piece
+    if pieces and not is_error_text(pieces[-1]):
+        backend._llm_cache.put(cache_key, "".join(pieces))
+
+
+async def chat(request):
+    data = await read_json(request)
+    if not data or "message" not in data:
+        return JSONResponse({"error": "Missing 'message' field"}, status_code=400)
+    user_message, context, cache_key = backend.prepare_chat(data)
+
+    if wants_event_stream(request):
+        tokens = astream_llm_answer(cache_key, user_message, context)
+
+        async def events():
+            async for piece in tokens:
+                yield sse_event("token", {"text": piece})
+            yield sse_event("done", {})
+
+        return sse_response(events())
+
+    future = backend.start_llm_answer(cache_key, user_message, context)
+    return JSONResponse({"response": await backend._llm_client.aresult(future)})
+
+
+async def explain(request):
+    data = await read_json(request) or {}
+    method = request.query_params.get("method") or data.get("method") or "occlusion"
+    job, error = await run_cpu(backend.prepare_explanation, data, method)
+    if error:
+        return JSONResponse({"error": error[0]}, status_code=error[1])
+
+    heatmap = run_cpu(backend.compute_heatmap, job["signal"], job["label"], method)
+
+    if wants_event_stream(request):
+        tokens = astream_llm_answer(job["cache_key"], job["prompt"])
+        # Send the LLM request now rather than after the heatmap
+        first_token = asyncio.ensure_future(anext(tokens, None))
+
+        async def events():
+            yield sse_event("heatmap", {"heatmap": await heatmap, "method": method})
+            piece = await first_token
+            if piece is not None:
+                yield sse_event("token", {"text": piece})
+                async for piece in tokens:
+                    yield sse_event("token", {"text": piece})
+            yield sse_event("done", {})
+
+        return sse_response(events())
+
+    llm_future = backend.start_llm_answer(job["cache_key"], job["prompt"])
+    return JSONResponse(
+        {
+            "heatmap": await heatmap,
+            "method": method,
+            "explanation_text": await backend._llm_client.aresult(llm_future),
+        }
+    )
+
+
+# ---------------------------------------------------------------------------
+# Live ECG streams (see live.py)
+# ---------------------------------------------------------------------------
+_live_sessions = SessionRegistry()
+
+
+async def classify_beats(beats):
+    """Class probabilities for (peak, window) beats through the shared
+    micro-batcher, so beats of all live sessions share model calls."""
+    if not beats:
+        return []
+    futures = [backend._batcher.submit(window[:, None]) for _, window in beats]
+    return await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+
+
+def decode_samples(message):
+    """Samples of one client message: binary float32, or JSON (array or
+    {"samples": [...]}). Returns None for {"type": "end"}."""
+    if message.get("bytes") is not None:
+        data = message["bytes"]
+        return np.frombuffer(data[: len(data) - len(data) % 4], dtype="<f4")
+    payload = json.loads(message.get("text") or "null")
+    if isinstance(payload, dict):
+        if payload.get("type") == "end":
+            return None
+        payload = payload.get("samples")
+    if not isinstance(payload, list):
+        raise ValueError('Send float32 binary frames, a JSON array or {"samples": [...]}')
+    try:
+        return np.asarray(payload, dtype=np.float32)
+    except (TypeError, ValueError):  # e.g. objects, strings or null in the list
+        raise ValueError("Samples must be numbers") from None
+
+
+async def live(websocket):
+    """
+    Live ECG stream of one patient: /ws/live/<patient_id>?fs=250.
+
+    The device sends samples as they are recorded. Beats are classified as
+    soon as their window is complete; beat, alert (with the last seconds of
+    ECG), episode and window messages go back on the same socket. Send
+    {"type": "end"} to get a summary and close.
+    """
+    try:
+        session = LiveSession(
+            websocket.path_params["patient_id"],
+            fs=float(websocket.query_params.get("fs", 125)),
+            align=websocket.query_params.get("align", "start"),
+            emit_beats=websocket.query_params.get("beats", "true").lower() != "false",
+            class_names=[backend.CLASS_MAPPING[idx] for idx in sorted(backend.CLASS_MAPPING)],
+        )
+        previous = _live_sessions.open(session, websocket)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    except RuntimeError as e:
+        await websocket.close(code=1013, reason=str(e))  # try again later
+        return
+    if previous is not None:
+        await previous.close(code=4000, reason="Replaced by a newer stream")
+
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), LIVE_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await websocket.close(code=1001, reason="Idle timeout")
+                return
+            if message["type"] == "websocket.disconnect":
+                return
+            try:
+                samples = decode_samples(message)
+                beats = session.segment(samples, final=samples is None)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "error": str(e)})
+                continue
+            final = samples is None
+            for reply in session.add(beats, await classify_beats(beats), final=final):
+                await websocket.send_json(reply)
+            if final:
+                await websocket.close()
+                return
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # client went away (or the stream was replaced)
+    finally:
+        _live_sessions.close(session)
+
+
+async def live_stats(request):
+    return JSONResponse(_live_sessions.stats())
+
+
+llm_routes = Starlette(
+    routes=[
+        Route("/api/chat", chat, methods=["POST"]),
+        Route("/api/explain", explain, methods=["POST"]),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["*"],
+            allow_methods=["GET", "POST", "OPTIONS"],
+            allow_headers=["Content-Type", "Authorization"],
+        )
+    ],
+)
+
+app = Starlette(
+    routes=[
+        Route("/api/chat", llm_routes),
+        Route("/api/explain", llm_routes),
+        Route("/api/live", live_stats),
+        WebSocketRoute("/ws/live/{patient_id}", live),
+        Mount("/", app=WSGIMiddleware(backend.app, workers=ASGI_WSGI_THREADS)),
+    ]
+)
@@ -0,0 +1,87 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-beat predictions into one model call.
+
+    Callers submit one (186, 1) window and get back a Future. A background
+    thread collects queued windows and flushes them as a single batch once
+    either `max_batch_size` windows are waiting or `max_wait_ms` has passed
+    since the first one arrived. Each future is resolved with its own row of
+    probabilities.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, window: np.ndarray) -> Future:
+        """Queue one window for prediction and return a future for its row."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((np.asarray(window, dtype=np.float32), future))
+        return future
+
+    def predict(self, window: np.ndarray, timeout=None) -> np.ndarray:
+        """Blocking helper: submit one window and wait for its probabilities."""
+        return self.submit(window).result(timeout=timeout)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so restart the worker in each
+        # gunicorn worker process the first time it is used there.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="micro-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Drop callers that cancelled while waiting in the queue
+            batch = [
+                (window, future)
+                for window, future in self._collect()
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            futures = [future for _, future in batch]
+            try:
+                probabilities = self.predict_fn(np.stack([w for w, _ in batch]))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, row in zip(futures, probabilities):
+                future.set_result(row)
@@ -0,0 +1,383 @@
+"""
+Latency and throughput benchmark of the API routes and the functions behind them.
+
+    python bench.py --json bench-$(git rev-parse --short HEAD).json
+    python bench.py --suite functions --concurrency 1 --requests 50
+    python bench.py --json new.json --compare old.json   # exit code 1 on regressions
+
+Routes are served by a new `python app.py` process (`uvicorn asgi:app`
+with --server asgi) with the prediction and LLM caches off and the LLM
+pointed at llm_stub.py, so every request does the full work. Functions
+run in this process. Inputs come from the sample dataset and the ECG
+images in the repository root.
+
+Each scenario (one input size at one concurrency) gets a short warm-up,
+then `--requests` calls spread over `concurrency` threads. It reports
+p50/p95/p99 latency, throughput and the peak RSS of the process doing the
+work (the server for routes; reset per scenario on Linux, cumulative
+elsewhere; inference pool replicas are not included).
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bench_cold_start import free_port, wait_for
+from llm_stub import start_stub_server
+from sample_store import SampleDataset
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+DEFAULT_IMAGES = "ecg_image1.png,ecg_image.png,ecg_image2.jpg"
+
+# Caches off: repeated payloads must not turn into cache hits
+BENCH_ENV = {
+    "PREDICTION_CACHE_SIZE": "0",
+    "LLM_CACHE_SIZE": "0",
+    "GROQ_API_KEY": "stub",
+}
+
+Scenario = namedtuple("Scenario", "kind name payload call")
+
+
+# ---------------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------------
+def make_signal(length):
+    """`length` samples of dataset beats laid end to end."""
+    dataset = SampleDataset().load()
+    beats = [dataset.get(row)[0] for row in range(dataset.count())]
+    reps = -(-length // sum(len(b) for b in beats))
+    return np.concatenate(beats * reps)[:length]
+
+
+def make_csv(n_rows):
+    """sample.csv rows repeated to `n_rows` lines."""
+    with open(os.path.join(BACKEND_DIR, "sample.csv"), "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    return b"".join(lines[i % len(lines)] for i in range(n_rows))
+
+
+def multipart(fields, files):
+    """(body, content type) of a multipart/form-data request."""
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+            f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode()
+            + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+# ---------------------------------------------------------------------------
+# Peak RSS
+# ---------------------------------------------------------------------------
+def reset_peak_rss(pid):
+    """Reset VmHWM of `pid` (Linux only; a no-op elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid == os.getpid():
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+def run_scenario(scenario, concurrency, requests, warmup, pid):
+    for _ in range(warmup):
+        scenario.call()
+    reset_peak_rss(pid)
+
+    def worker(n):
+        latencies, errors = [], []
+        for _ in range(n):
+            start = time.perf_counter()
+            try:
+                scenario.call()
+            except Exception as e:
+                errors.append(repr(e))
+                continue
+            latencies.append(time.perf_counter() - start)
+        return latencies, errors
+
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(worker, shares))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([t for done, _ in outcomes for t in done]) * 1000
+    errors = [e for _, failed in outcomes for e in failed]
+    result = {
+        "kind": scenario.kind,
+        "name": scenario.name,
+        "payload": scenario.payload,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {},
+        "peak_rss_mb": peak_rss_mb(pid),
+    }
+    if len(latencies):
+        result["latency_ms"] = {
+            "p50": round(float(np.percentile(latencies, 50)), 4),
+            "p95": round(float(np.percentile(latencies, 95)), 4),
+            "p99": round(float(np.percentile(latencies, 99)), 4),
+            "mean": round(float(latencies.mean()), 4),
+            "max": round(float(latencies.max()), 4),
+        }
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+def post(url, body, content_type):
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"HTTP {e.code}: {e.read()[:200]!r}") from None
+
+
+def route_scenarios(base, lengths, csv_rows, images):
+    scenarios = []
+
+    def add(name, payload, path, body, content_type):
+        def call():
+            post(base + path, body, content_type)
+
+        scenarios.append(Scenario("route", name, payload, call))
+
+    for length in lengths:
+        signal = make_signal(length).tolist()
+        add("/api/predict json", f"{length} samples", "/api/predict",
+            json.dumps({"signal": signal}).encode(), "application/json")
+        add("/api/explain", f"{length} samples", "/api/explain",
+            json.dumps({"signal": signal, "label": 1}).encode(), "application/json")
+    for n_rows in csv_rows:
+        body, content_type = multipart({"row": 0}, {"file": ("sample.csv", make_csv(n_rows))})
+        add("/api/predict csv", f"{n_rows} rows", "/api/predict", body, content_type)
+        body, content_type = multipart({}, {"file": ("sample.csv", make_csv(n_rows))})
+        add("/api/predict/batch", f"{n_rows} rows", "/api/predict/batch", body, content_type)
+    for name, content in images:
+        body, content_type = multipart({}, {"file": (name, content)})
+        add("/api/predict/image", f"{name} ({len(content) // 1024} KiB)", "/api/predict/image",
+            body, content_type)
+    return scenarios
+
+
+def function_scenarios(lengths, images):
+    import app
+    import digitizer
+
+    scenarios = []
+    for length in lengths:
+        signal = make_signal(length)
+        payload = f"{length} samples"
+        scenarios += [
+            Scenario("function", "preprocess_signal", payload,
+                     lambda s=signal: app.preprocess_signal(s)),
+            Scenario("function", "extract_features", payload,
+                     lambda s=signal: app.extract_features(s)),
+            Scenario("function", "explain_prediction", payload,
+                     lambda s=signal: app.explain_prediction(app._predictor, s, 1)),
+        ]
+    for name, content in images:
+        scenarios.append(Scenario(
+            "function", "digitizer.process_image", f"{name} ({len(content) // 1024} KiB)",
+            lambda c=content: digitizer.process_image(io.BytesIO(c)),
+        ))
+    return scenarios
+
+
+def start_server(kind, env, timeout=180):
+    """Start the API in a new process; returns (process, base url)."""
+    port = free_port()
+    if kind == "asgi":
+        command = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port),
+                   "--log-level", "warning"]
+    else:
+        command = [sys.executable, "app.py"]
+    process = subprocess.Popen(
+        command, cwd=BACKEND_DIR, env=dict(env, PORT=str(port), MODEL_PRELOAD="true"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(f"{base}/api/ready", time.perf_counter(), timeout, process)
+    except Exception:
+        process.terminate()
+        raise
+    return process, base
+
+
+# ---------------------------------------------------------------------------
+# Comparison
+# ---------------------------------------------------------------------------
+def result_key(result):
+    return result["kind"], result["name"], result["payload"], result["concurrency"]
+
+
+def compare(results, baseline_path, tolerance):
+    """Print changes against an earlier run; returns the regressed scenarios."""
+    with open(baseline_path) as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\nvs {baseline_path} (tolerance {tolerance:.0%})")
+    print(f"{'scenario':<62} {'p95':>9} {'rps':>9}")
+    for result in results:
+        old = baseline.get(result_key(result))
+        if not old or not old["latency_ms"] or not result["latency_ms"]:
+            continue
+        p95 = result["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1
+        rps = result["throughput_rps"] / old["throughput_rps"] - 1
+        regressed = p95 > tolerance or rps < -tolerance
+        if regressed:
+            regressions.append(result)
+        label = f"{result['name']} [{result['payload']}] x{result['concurrency']}"
+        print(f"{label:<62} {p95:>+9.1%} {rps:>+9.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+def describe_commit():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--suite", choices=("all", "routes", "functions"), default="all")
+    parser.add_argument("--server", choices=("app", "asgi"), default="app",
+                        help="serve routes with app.py (Flask) or asgi.py (uvicorn)")
+    parser.add_argument("--backend", help="INFERENCE_BACKEND for the server and functions")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8],
+                        help="comma-separated client thread counts")
+    parser.add_argument("--requests", type=int, default=100, help="calls per scenario")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed calls per scenario")
+    parser.add_argument("--signal-lengths", type=int_list, default=[187, 1000],
+                        help="samples per JSON signal / function input")
+    parser.add_argument("--csv-rows", type=int_list, default=[6, 1000],
+                        help="rows per uploaded CSV")
+    parser.add_argument("--images", default=DEFAULT_IMAGES,
+                        help="comma-separated image files (relative to the repository root)")
+    parser.add_argument("--llm-delay", type=float, default=0.0,
+                        help="seconds the stubbed LLM takes per answer")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative p95/throughput change counted as a regression")
+    args = parser.parse_args()
+
+    images = []
+    for name in args.images.split(","):
+        with open(os.path.join(REPO_DIR, name), "rb") as f:
+            images.append((name, f.read()))
+
+    _, llm_url = start_stub_server(delay=args.llm_delay)
+    env = dict(os.environ, **BENCH_ENV, GROQ_BASE_URL=llm_url)
+    if args.backend:
+        env["INFERENCE_BACKEND"] = args.backend
+
+    print(f"{'kind':<9} {'scenario':<26} {'payload':<26} {'conc':>4} {'p50 ms':>9} "
+          f"{'p95 ms':>9} {'p99 ms':>9} {'rps':>9} {'RSS MB':>8} {'err':>4}")
+    results = []
+
+    def run(scenarios, pid):
+        for scenario in scenarios:
+            for concurrency in args.concurrency:
+                result = run_scenario(scenario, concurrency, args.requests, args.warmup, pid)
+                results.append(result)
+                latency = result["latency_ms"]
+                print(
+                    f"{result['kind']:<9} {result['name']:<26} {result['payload']:<26} "
+                    f"{concurrency:>4} {latency.get('p50', float('nan')):>9.2f} "
+                    f"{latency.get('p95', float('nan')):>9.2f} "
+                    f"{latency.get('p99', float('nan')):>9.2f} "
+                    f"{result['throughput_rps']:>9.1f} {result['peak_rss_mb'] or 0:>8.1f} "
+                    f"{result['errors']:>4}",
+                    flush=True,
+                )
+
+    if args.suite in ("all", "routes"):
+        process, base = start_server(args.server, env)
+        try:
+            run(route_scenarios(base, args.signal_lengths, args.csv_rows, images), process.pid)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    if args.suite in ("all", "functions"):
+        # Same settings as the server, applied before `app` is imported
+        os.environ.update(env, MODEL_PRELOAD="false")
+        run(function_scenarios(args.signal_lengths, images), os.getpid())
+
+    if args.json:
+        report = {
+            "commit": describe_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {
+                key: value for key, value in vars(args).items()
+                if key not in ("json", "compare", "tolerance")
+            },
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
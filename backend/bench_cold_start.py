@@ -0,0 +1,108 @@
+"""
+Cold-start benchmark: how long a fresh worker takes to become live and ready.
+
+    python bench_cold_start.py                      # keras and snapshot backends
+    python bench_cold_start.py --backends snapshot --runs 5 --json cold_start.json
+
+Each run starts `python app.py` in a new process on a free port and polls
+/api/health (liveness) and /api/ready (readiness), then times the first
+/api/predict. Times are seconds since the process was spawned.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BEAT = [0.0] * 60 + [1.0] * 6 + [0.0] * 120
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _status(url, data=None):
+    request = urllib.request.Request(
+        url, data=data, headers={"Content-Type": "application/json"} if data else {}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def wait_for(url, start, timeout, process):
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        if _status(url) == 200:
+            return time.perf_counter() - start
+        time.sleep(0.02)
+    raise RuntimeError(f"{url} not ready after {timeout} s")
+
+
+def cold_start(backend, preload="background", timeout=120):
+    """One cold start; returns a dict of timings in seconds."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ, PORT=str(port), INFERENCE_BACKEND=backend,
+        MODEL_PRELOAD=preload, PREDICTION_CACHE_SIZE="0",
+    )
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        live = wait_for(f"{base}/api/health", start, timeout, process)
+        ready = wait_for(f"{base}/api/ready", start, timeout, process)
+        request_start = time.perf_counter()
+        status = _status(f"{base}/api/predict", json.dumps({"signal": BEAT}).encode())
+        if status != 200:
+            raise RuntimeError(f"/api/predict returned {status}")
+        first_predict = time.perf_counter() - request_start
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {"live_s": live, "ready_s": ready, "first_predict_s": first_predict}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", default="keras,snapshot",
+                        help="comma-separated INFERENCE_BACKEND values")
+    parser.add_argument("--preload", default="background", help="MODEL_PRELOAD value")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'backend':<10} {'live (s)':>9} {'ready (s)':>10} {'1st predict (s)':>16}")
+    for backend in args.backends.split(","):
+        runs = [cold_start(backend, args.preload) for _ in range(args.runs)]
+        summary = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        results[backend] = {"median": summary, "runs": runs}
+        print(
+            f"{backend:<10} {summary['live_s']:>9.2f} {summary['ready_s']:>10.2f} "
+            f"{summary['first_predict_s']:>16.3f}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"preload": args.preload, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 import tensorflow as tf
+import json
 import os
+import sys
+import numpy as np
 
 def convert():
     model_path = "best_model.h5"
@@ -23,5 +26,99 @@ def convert():
     
     print(f"Success! Model saved to {tflite_path}")
 
+def convert_onnx():
+    """Export the Keras model to ONNX for INFERENCE_BACKEND=onnx (needs tf2onnx)."""
+    model_path = "best_model.h5"
+    onnx_path = "model.onnx"
+
+    if not os.path.exists(model_path):
+        print(f"Error: {model_path} not found.")
+        return
+
+    try:
+        import tf2onnx
+    except ImportError:
+        print("Error: tf2onnx is not installed (pip install tf2onnx).")
+        return
+
+    print("Loading Keras model...")
+    model = tf.keras.models.load_model(model_path, compile=False)
+
+    print("Converting to ONNX...")
+    # Dynamic batch dimension so the backend can run any batch size
+    spec = (tf.TensorSpec((None, 186, 1), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=onnx_path)
+
+    print(f"Success! Model saved to {onnx_path}")
+
+def convert_snapshot():
+    """Export layer specs and weights for INFERENCE_BACKEND=snapshot (no TensorFlow at runtime)."""
+    model_path = "best_model.h5"
+    snapshot_path = "model_snapshot.npz"
+
+    if not os.path.exists(model_path):
+        print(f"Error: {model_path} not found.")
+        return
+
+    print("Loading Keras model...")
+    model = tf.keras.models.load_model(model_path, compile=False)
+
+    print("Exporting weight snapshot...")
+    layers = []
+    arrays = {}
+    for layer in model.layers:
+        kind = type(layer).__name__
+        config = layer.get_config()
+        if kind in ("InputLayer", "Dropout"):
+            continue
+        spec = {"type": kind}
+        if kind == "Conv1D":
+            if config["dilation_rate"] not in ((1,), [1], 1):
+                print(f"Error: dilated Conv1D ({layer.name}) is not supported.")
+                return
+            spec.update(strides=config["strides"][0], padding=config["padding"],
+                        activation=config["activation"])
+            weights = layer.get_weights()
+        elif kind == "BatchNormalization":
+            spec["epsilon"] = config["epsilon"]
+            # Always gamma, beta, mean, variance (scale/center may be disabled)
+            stored = layer.get_weights()
+            channels = stored[-1].shape[0]
+            gamma = stored.pop(0) if config["scale"] else np.ones(channels)
+            beta = stored.pop(0) if config["center"] else np.zeros(channels)
+            weights = [gamma, beta] + stored
+        elif kind == "MaxPooling1D":
+            spec.update(pool_size=config["pool_size"][0], strides=config["strides"][0],
+                        padding=config["padding"])
+            weights = []
+        elif kind == "Flatten":
+            weights = []
+        elif kind == "Dense":
+            spec["activation"] = config["activation"]
+            weights = layer.get_weights()
+        else:
+            print(f"Error: layer type {kind} ({layer.name}) is not supported by the snapshot.")
+            return
+        spec["n_weights"] = len(weights)
+        for j, weight in enumerate(weights):
+            arrays[f"layer{len(layers)}_weight{j}"] = np.asarray(weight, dtype=np.float32)
+        layers.append(spec)
+
+    np.savez(snapshot_path, layers=np.array(json.dumps(layers)), **arrays)
+
+    # The snapshot must reproduce the Keras model
+    from model_manager import SnapshotBackend
+
+    backend = SnapshotBackend(os.path.abspath(snapshot_path))
+    backend.load()
+    sample = np.random.default_rng(0).normal(size=(64, 186, 1)).astype(np.float32)
+    error = float(np.abs(backend.predict(sample) - model.predict(sample, verbose=0)).max())
+    print(f"Success! Snapshot saved to {snapshot_path} (max difference {error:.2e})")
+
 if __name__ == "__main__":
-    convert()
+    if "--onnx" in sys.argv:
+        convert_onnx()
+    elif "--snapshot" in sys.argv:
+        convert_snapshot()
+    else:
+        convert()
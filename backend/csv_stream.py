@@ -0,0 +1,78 @@
+import io
+
+import numpy as np
+
+TARGET_LENGTH = 186
+
+
+class CsvRowReader:
+    """
+    Stream numeric rows out of a CSV upload without loading the whole file.
+
+    The stream is read in fixed-size byte blocks and split into lines; rows
+    outside [start_row, end_row] are only counted, and the requested rows are
+    parsed a block of `block_rows` at a time into `dtype` (float32) arrays
+    holding the first `n_cols` columns. Iterating yields
+    (first_row_index, rows) pairs; `total_rows` is known once iteration has
+    finished. Blank lines are skipped, matching pandas.read_csv.
+    """
+
+    def __init__(self, stream, start_row=0, end_row=None, n_cols=TARGET_LENGTH,
+                 block_rows=4096, read_bytes=1 << 20, dtype=np.float32):
+        self.stream = stream
+        self.start_row = start_row
+        self.end_row = end_row
+        self.n_cols = n_cols
+        self.block_rows = block_rows
+        self.read_bytes = read_bytes
+        self.dtype = dtype
+        self.total_rows = 0
+
+    def _lines(self):
+        leftover = b""
+        while True:
+            data = self.stream.read(self.read_bytes)
+            if not data:
+                break
+            lines = (leftover + data).split(b"\n")
+            leftover = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield line
+        if leftover.strip():
+            yield leftover
+
+    def _parse(self, lines):
+        import pandas as pd  # deferred: importing pandas costs ~0.5 s at startup
+
+        block = pd.read_csv(io.BytesIO(b"\n".join(lines)), header=None, dtype=self.dtype)
+        return np.ascontiguousarray(block.to_numpy(dtype=self.dtype)[:, : self.n_cols])
+
+    def __iter__(self):
+        selected, first = [], None
+        row = -1
+        for row, line in enumerate(self._lines()):
+            if row < self.start_row:
+                continue
+            if self.end_row is not None and row > self.end_row:
+                continue  # keep counting rows for total_rows
+            if first is None:
+                first = row
+            selected.append(line)
+            if len(selected) == self.block_rows:
+                yield first, self._parse(selected)
+                selected, first = [], None
+        if selected:
+            yield first, self._parse(selected)
+        self.total_rows = row + 1
+
+
+def read_csv_row(stream, row, n_cols=TARGET_LENGTH, dtype=np.float64):
+    """Return (values, total_rows) for one row; values is None if out of range."""
+    reader = CsvRowReader(
+        stream, start_row=row, end_row=row, n_cols=n_cols, block_rows=1, dtype=dtype
+    )
+    values = None
+    for _, block in reader:
+        values = block[0]
+    return values, reader.total_rows
@@ -1,68 +1,134 @@
 import cv2
 import numpy as np
 
-def process_image(file_stream):
-    """
-    Process an ECG image stream to extract a normalized 1D signal.
-    """
-    # Read image from file stream
-    file_bytes = np.asarray(bytearray(file_stream.read()), dtype=np.uint8)
-    img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+import preprocessing
+
+TARGET_LENGTH = preprocessing.TARGET_LENGTH
 
+
+def decode_image(file_stream):
+    """Read an image file stream into a BGR array."""
+    file_bytes = np.frombuffer(file_stream.read(), dtype=np.uint8)
+    img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
     if img is None:
         raise ValueError("Could not decode image")
+    return img
 
-    # Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-    # Thresholding to isolate the black trace
-    # Assuming the trace is darker than background (grid)
-    # Using adaptive threshold or simple binary threshold
-    _, binary = cv2.threshold(gray, 120, 255, cv2.THRESH_BINARY_INV)
+def remove_grid_lines(binary, min_fraction=0.8):
+    """
+    Remove straight grid lines from a binary trace mask.
+
+    Printed ECG paper has horizontal and vertical lines that run across
+    almost the whole strip; the trace never does. Rows and columns whose
+    ink covers at least `min_fraction` of the image are cleared.
+    """
+    height, width = binary.shape
+    grid_rows = np.count_nonzero(binary, axis=1) >= min_fraction * width
+    grid_cols = np.count_nonzero(binary, axis=0) >= min_fraction * height
+    if not grid_rows.any() and not grid_cols.any():
+        return binary
+    cleaned = binary.copy()
+    cleaned[grid_rows, :] = 0
+    cleaned[:, grid_cols] = 0
+    return cleaned
 
-    # Find coordinates of dark pixels
-    points = np.column_stack(np.where(binary > 0))
 
-    # If no points found (blank image?)
-    if len(points) == 0:
+def split_leads(binary, n_leads=None, min_gap=5):
+    """
+    Split a multi-lead printout into horizontal lead strips.
+
+    With `n_leads` the image is cut into equal-height strips. Otherwise
+    strips are the row bands that contain trace pixels, separated by at
+    least `min_gap` empty rows.
+    """
+    height = binary.shape[0]
+    if n_leads:
+        bounds = np.linspace(0, height, n_leads + 1).astype(int)
+        return [binary[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    has_ink = np.count_nonzero(binary, axis=1) > 0
+    edges = np.diff(has_ink.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return [binary]
+    # Merge bands separated by small gaps (e.g. a broken trace)
+    split = np.flatnonzero(starts[1:] - ends[:-1] >= min_gap)
+    band_starts = starts[np.concatenate(([0], split + 1))]
+    band_ends = ends[np.concatenate((split, [len(ends) - 1]))]
+    return [binary[a:b] for a, b in zip(band_starts, band_ends)]
+
+
+def trace_from_mask(mask, statistic="mean"):
+    """
+    Column-wise trace position (negated row index) of the dark pixels.
+
+    Columns without any pixel are skipped. `statistic` is "mean" (centroid)
+    or "median" of the row indices in each column.
+    """
+    ink = mask > 0
+    counts = np.count_nonzero(ink, axis=0)
+    columns = np.flatnonzero(counts)
+    if len(columns) == 0:
         raise ValueError("No ECG trace detected in image")
+    ink = ink[:, columns]
+    counts = counts[columns]
+
+    if statistic == "median":
+        # First row at which half of the column's pixels have been seen
+        cumulative = np.cumsum(ink, axis=0, dtype=np.int32)
+        y = np.argmax(cumulative >= (counts + 1) // 2, axis=0).astype(np.float64)
+    else:
+        rows = np.arange(ink.shape[0], dtype=np.float64)
+        y = (rows @ ink) / counts
+
+    # Invert Y because image coordinates (0,0) is top-left, but graph (0,0) is bottom-left
+    return -y
+
 
-    # Sort by X coordinate (column index)
-    # points[:, 1] is X (column), points[:, 0] is Y (row)
-    # We want to map X -> Y value
-    # Since multiple Ys might exist for one X (thick line), we take mean or median Y
-    
-    # Dict to store Y values for each X
-    x_y_map = {}
-    for y, x in points:
-        if x not in x_y_map:
-            x_y_map[x] = []
-        x_y_map[x].append(y)
-    
-    # Extract mean Y for each unique X
-    sorted_x = sorted(x_y_map.keys())
-    extracted_signal = []
-    
-    for x in sorted_x:
-        ys = x_y_map[x]
-        # Invert Y because image coordinates (0,0) is top-left, but graph (0,0) is bottom-left
-        # Actually ECG is just signal, inversion relative to image height
-        avg_y = np.mean(ys)
-        extracted_signal.append(-avg_y) 
-
-    extracted_signal = np.array(extracted_signal)
-
-    # Normalize signal to -1 to 1 range (approx) via Z-score or MinMax
-    # Better: MinMax scaling to 0-1 then shift to -0.5 to 0.5?
+def normalize_and_resample(trace, target_length=TARGET_LENGTH):
+    """Z-score the trace and linearly resample it to `target_length`."""
     # Our model expects variance ~1. Let's use Z-score.
-    extracted_signal = (extracted_signal - np.mean(extracted_signal)) / (np.std(extracted_signal) + 1e-6)
+    trace = preprocessing.normalize(trace, "zscore")
+    return preprocessing.resize(trace, target_length)
 
-    # Resample to TARGET_LENGTH (186)
-    target_length = 186
-    if len(extracted_signal) != target_length:
-        # Use simple linear interpolation to resize
-        x_old = np.linspace(0, 1, len(extracted_signal))
-        x_new = np.linspace(0, 1, target_length)
-        extracted_signal = np.interp(x_new, x_old, extracted_signal)
 
-    return extracted_signal
+def binarize(img, threshold=120, remove_grid=True):
+    """Grayscale + inverse threshold so the (dark) trace is white."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV)
+    if remove_grid:
+        binary = remove_grid_lines(binary)
+    return binary
+
+
+def extract_leads(file_stream, n_leads=None, remove_grid=True, statistic="mean"):
+    """
+    Return `(lead, signal)` for every lead strip with a trace, where
+    `signal` is normalized to 186 samples and `lead` is the strip index
+    that `process_image` takes (strips without ink are skipped).
+    """
+    binary = binarize(decode_image(file_stream), remove_grid=remove_grid)
+    leads = []
+    for lead, strip in enumerate(split_leads(binary, n_leads)):
+        if np.count_nonzero(strip) == 0:
+            continue
+        leads.append((lead, normalize_and_resample(trace_from_mask(strip, statistic))))
+    if not leads:
+        raise ValueError("No ECG trace detected in image")
+    return leads
+
+
+def process_image(file_stream, lead=0, n_leads=1, remove_grid=True, statistic="mean"):
+    """
+    Process an ECG image stream to extract a normalized 1D signal.
+
+    For multi-lead printouts pass `n_leads` (or None to detect the strips)
+    and the `lead` index to return.
+    """
+    binary = binarize(decode_image(file_stream), remove_grid=remove_grid)
+    strips = split_leads(binary, n_leads) if n_leads != 1 else [binary]
+    if not 0 <= lead < len(strips):
+        raise ValueError(f"Lead {lead} out of range. Image has {len(strips)} leads.")
+    return normalize_and_resample(trace_from_mask(strips[lead], statistic))
@@ -0,0 +1,173 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# ---------------------------------------------------------------------------
+# Vectorized R-peak detection and beat-to-beat features
+# Everything here is NumPy array work; Python only loops over the (rare)
+# peaks that violate the refractory period.
+# ---------------------------------------------------------------------------
+DETECTION_METHODS = ("threshold", "pan_tompkins")
+
+
+def moving_average(x: np.ndarray, width: int) -> np.ndarray:
+    """Centered moving average via cumulative sums (O(n) for any width)."""
+    width = max(1, int(width))
+    if width == 1:
+        return x.astype(np.float64, copy=True)
+    padded = np.pad(x.astype(np.float64), (width // 2, width - 1 - width // 2), mode="edge")
+    csum = np.cumsum(padded)
+    csum = np.concatenate(([0.0], csum))
+    return (csum[width:] - csum[:-width]) / width
+
+
+def _block_normalize(x: np.ndarray, block: int) -> np.ndarray:
+    """
+    Min-max scale x to [0, 1] within consecutive blocks, so thresholds adapt
+    to amplitude drift over long records. Short signals use a single block.
+    """
+    n = len(x)
+    if n <= block:
+        lo, hi = x.min(), x.max()
+        span = hi - lo
+        return (x - lo) / span if span > 0 else np.zeros_like(x, dtype=np.float64)
+    starts = np.arange(0, n, block)
+    lo = np.repeat(np.minimum.reduceat(x, starts), np.diff(np.append(starts, n)))
+    hi = np.repeat(np.maximum.reduceat(x, starts), np.diff(np.append(starts, n)))
+    span = hi - lo
+    with np.errstate(invalid="ignore", divide="ignore"):
+        norm = np.where(span > 0, (x - lo) / span, 0.0)
+    return norm
+
+
+def _run_maxima(score: np.ndarray, above: np.ndarray) -> np.ndarray:
+    """Index of the highest sample inside each contiguous run where `above`."""
+    idx = np.flatnonzero(above)
+    if len(idx) == 0:
+        return idx
+    run_id = np.concatenate(([0], np.cumsum(np.diff(idx) > 1)))
+    # Group-wise argmax: sort by run, then by descending score (stable, so the
+    # first of equal maxima wins) and take the first entry of every run
+    order = np.lexsort((-score[idx], run_id))
+    sorted_runs = run_id[order]
+    first = np.concatenate(([True], sorted_runs[1:] != sorted_runs[:-1]))
+    return idx[order[first]]
+
+
+def _local_maxima(score: np.ndarray, above: np.ndarray) -> np.ndarray:
+    """Interior samples where `above` that are higher than both neighbours."""
+    centre = score[1:-1]
+    is_peak = above[1:-1] & (centre > score[:-2]) & (centre > score[2:])
+    return np.flatnonzero(is_peak) + 1
+
+
+def _enforce_refractory(peaks: np.ndarray, score: np.ndarray, refractory: float,
+                        keep="strongest") -> np.ndarray:
+    """
+    Drop peaks within `refractory` samples of the previous kept one: the
+    later peak is dropped (keep="first") or replaces the kept one when it
+    is higher (keep="strongest").
+    """
+    if len(peaks) < 2 or np.all(np.diff(peaks) > refractory):
+        return peaks
+    kept = [peaks[0]]
+    for p in peaks[1:]:
+        if p - kept[-1] > refractory:
+            kept.append(p)
+        elif keep == "strongest" and score[p] > score[kept[-1]]:
+            kept[-1] = p
+    return np.asarray(kept, dtype=np.int64)
+
+
+def detect_r_peaks(signal, fs=125, method="threshold", threshold=0.6,
+                   refractory=0.2, block_seconds=5.0) -> np.ndarray:
+    """
+    Return R-peak sample indices for a 1-D ECG signal of any length.
+
+    "threshold" keeps the original heuristic: every interior local maximum
+    above `threshold` of the (block-wise) normalised signal, unless it comes
+    within the refractory period of the previous peak. "pan_tompkins"
+    band-passes, differentiates, squares and integrates the signal first,
+    then locates each R-peak at the largest filtered sample of the QRS.
+    """
+    if method not in DETECTION_METHODS:
+        raise ValueError(f"Unknown detection method '{method}'")
+    x = np.asarray(signal, dtype=np.float64).ravel()
+    if len(x) < 3:
+        return np.zeros(0, dtype=np.int64)
+    refractory_samples = max(1.0, refractory * fs)
+    block = max(int(block_seconds * fs), 1)
+
+    if method == "threshold":
+        score = _block_normalize(x, block)
+        peaks = _local_maxima(score, score > threshold)
+        return _enforce_refractory(peaks, score, refractory_samples, keep="first")
+
+    # Pan-Tompkins style: band-pass ~5-15 Hz as a difference of moving averages
+    baseline_removed = x - moving_average(x, int(0.2 * fs))
+    filtered = moving_average(baseline_removed, max(1, int(fs / 30)))
+    slope = np.gradient(filtered)
+    integrated = moving_average(slope ** 2, max(1, int(0.15 * fs)))
+    energy = _block_normalize(integrated, block)
+    qrs = _run_maxima(energy, energy > threshold * 0.5)
+    qrs = _enforce_refractory(qrs, energy, refractory_samples)
+    if len(qrs) == 0:
+        return qrs
+
+    # Snap each QRS to its R-peak: largest |filtered| within +-75 ms
+    half = max(1, int(0.075 * fs))
+    padded = np.pad(np.abs(filtered), half, mode="constant")
+    windows = sliding_window_view(padded, 2 * half + 1)[qrs]
+    return _enforce_refractory(
+        qrs + windows.argmax(axis=1) - half, np.abs(filtered), refractory_samples
+    )
+
+
+def estimate_qrs_widths(signal, peaks, fs=125, search=0.1, level=0.2) -> np.ndarray:
+    """
+    QRS width (ms) per peak: span around the R-peak where the absolute slope
+    stays above `level` of its local maximum, searched within +-`search` s.
+    """
+    peaks = np.asarray(peaks, dtype=np.int64)
+    if len(peaks) == 0:
+        return np.zeros(0)
+    half = max(2, int(search * fs))
+    slope = np.abs(np.gradient(np.asarray(signal, dtype=np.float64)))
+    windows = sliding_window_view(np.pad(slope, half), 2 * half + 1)[peaks]
+    active = windows > level * windows.max(axis=1, keepdims=True)
+    first = active.argmax(axis=1)
+    last = active.shape[1] - 1 - active[:, ::-1].argmax(axis=1)
+    return (last - first + 1) * 1000.0 / fs
+
+
+def hrv_stats(peaks, fs=125) -> dict:
+    """RR intervals (ms) and time-domain HRV: SDNN, RMSSD, pNN50."""
+    rr = np.diff(np.asarray(peaks, dtype=np.float64)) * 1000.0 / fs
+    stats = {"rr_intervals_ms": rr, "sdnn_ms": 0.0, "rmssd_ms": 0.0, "pnn50": 0.0}
+    if len(rr) >= 2:
+        successive = np.diff(rr)
+        stats["sdnn_ms"] = float(np.std(rr, ddof=1))
+        stats["rmssd_ms"] = float(np.sqrt(np.mean(successive ** 2)))
+        stats["pnn50"] = float(np.mean(np.abs(successive) > 50.0) * 100.0)
+    return stats
+
+
+def compute_features(signal, fs=125, method="threshold") -> dict:
+    """Peaks, RR intervals, heart rate, HRV and QRS width for one signal."""
+    x = np.asarray(signal, dtype=np.float64).ravel()
+    peaks = detect_r_peaks(x, fs=fs, method=method)
+    hrv = hrv_stats(peaks, fs)
+    widths = estimate_qrs_widths(x, peaks, fs)
+    rr = hrv["rr_intervals_ms"]
+    rr_avg = float(np.mean(rr)) if len(rr) else 0.0
+    return {
+        "peaks": peaks,
+        "rr_intervals_ms": rr,
+        "bpm": 60000.0 / rr_avg if rr_avg > 0 else 0.0,
+        "rr_avg_ms": rr_avg,
+        "sdnn_ms": hrv["sdnn_ms"],
+        "rmssd_ms": hrv["rmssd_ms"],
+        "pnn50": hrv["pnn50"],
+        "qrs_widths_ms": widths,
+        "qrs_width_ms": float(np.median(widths)) if len(widths) else 0.0,
+        "amplitude": float(x.max() - x.min()) if len(x) else 0.0,
+    }
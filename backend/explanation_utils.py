@@ -1,54 +1,90 @@
+import numpy as np
+import tensorflow as tf
+
+TARGET_LENGTH = 186
 
 # ---------------------------------------------------------------------------
-# Explainability (Occlusion Sensitivity)
+# Gradient-based explanations
+# Occlusion sensitivity (explain_prediction in app.py) needs one forward pass
+# per occluded window; these need a single traced backward pass (or one
+# batched pass over the interpolation path for integrated gradients).
 # ---------------------------------------------------------------------------
-def explain_prediction(model, signal, target_class_idx, window_size=10, stride=5):
-    """
-    Generate an importance heatmap using occlusion sensitivity.
-    We slide a zero-mask over the signal and measure the drop in confidence.
-    Higher drop = Higher importance.
-    """
-    heatmap = np.zeros_like(signal)
-    counts = np.zeros_like(signal)
-
-    # Base prediction probability for the target class
-    base_pred = model.predict(signal.reshape(1, TARGET_LENGTH, 1), verbose=0)[0][target_class_idx]
-    
-    for i in range(0, len(signal) - window_size, stride):
-        # Create occluded signal
-        occluded = signal.copy()
-        occluded[i : i + window_size] = 0  # Mask with zeros
-        
-        # Predict on occluded signal
-        pred = model.predict(occluded.reshape(1, TARGET_LENGTH, 1), verbose=0)[0][target_class_idx]
-        
-        # Importance = Drop in confidence
-        importance = max(0, base_pred - pred)
-        
-        # Accumulate importance
-        heatmap[i : i + window_size] += importance
-        counts[i : i + window_size] += 1
-
-    # Average and normalize
-    heatmap = heatmap / (counts + 1e-7)
-    heatmap = (heatmap - np.min(heatmap)) / (np.max(heatmap) - np.min(heatmap) + 1e-7)
-    
-    return heatmap.tolist()
-
-@app.route("/api/explain", methods=["POST"])
-def explain():
-    """Explain a specific ECG prediction."""
-    model = get_model()
-    data = request.get_json()
-    signal = np.array(data.get("signal"), dtype=np.float64)
-    label_idx = int(data.get("label"))
-    
-    heatmap = explain_prediction(model, signal, label_idx)
-    
-    # Cleanup
-    if "model" in locals():
-        del model
-    tf.keras.backend.clear_session()
-    gc.collect()
-    
-    return jsonify({"heatmap": heatmap})
+GRADIENT_METHODS = ("integrated_gradients", "gradient_x_input", "gradcam")
+
+
+def normalize_heatmap(heatmap: np.ndarray) -> np.ndarray:
+    """Min-max scale a heatmap to [0, 1] (all zeros if it is flat)."""
+    heatmap = np.asarray(heatmap, dtype=np.float64)
+    h_min, h_max = np.min(heatmap), np.max(heatmap)
+    if h_max > h_min:
+        return (heatmap - h_min) / (h_max - h_min)
+    return np.zeros_like(heatmap)
+
+
+class GradientExplainer:
+    """Saliency maps for a Keras model with a (None, 186, 1) input."""
+
+    def __init__(self, model, conv_layer_name=None):
+        self.model = model
+        conv_layer = (
+            model.get_layer(conv_layer_name)
+            if conv_layer_name
+            else [l for l in model.layers if isinstance(l, tf.keras.layers.Conv1D)][-1]
+        )
+        self.conv_layer_name = conv_layer.name
+        self._cam_model = tf.keras.Model(
+            model.inputs, [conv_layer.output, model.outputs[0]]
+        )
+
+        spec = [
+            tf.TensorSpec(shape=(None, TARGET_LENGTH, 1), dtype=tf.float32),
+            tf.TensorSpec(shape=(), dtype=tf.int32),
+        ]
+        self._input_gradients = tf.function(self._input_gradients_fn, input_signature=spec)
+        self._gradcam = tf.function(self._gradcam_fn, input_signature=spec)
+
+    def _input_gradients_fn(self, x, class_idx):
+        with tf.GradientTape() as tape:
+            tape.watch(x)
+            target = self.model(x, training=False)[:, class_idx]
+        return tape.gradient(target, x)
+
+    def _gradcam_fn(self, x, class_idx):
+        with tf.GradientTape() as tape:
+            conv_out, probs = self._cam_model(x, training=False)
+            target = probs[:, class_idx]
+        grads = tape.gradient(target, conv_out)
+        # Channel weights = gradients averaged over time
+        weights = tf.reduce_mean(grads, axis=1, keepdims=True)
+        return tf.nn.relu(tf.reduce_sum(weights * conv_out, axis=-1))
+
+    def gradient_x_input(self, window: np.ndarray, class_idx: int) -> np.ndarray:
+        x = window.reshape(1, TARGET_LENGTH, 1).astype(np.float32)
+        grads = self._input_gradients(x, class_idx).numpy()
+        return np.abs(grads * x)[0, :, 0]
+
+    def integrated_gradients(self, window: np.ndarray, class_idx: int, steps=32,
+                             baseline=None) -> np.ndarray:
+        x = window.reshape(TARGET_LENGTH, 1).astype(np.float32)
+        if baseline is None:
+            baseline = np.zeros_like(x)
+        # All points on the baseline -> input path go through one batched pass
+        alphas = np.linspace(0.0, 1.0, steps + 1, dtype=np.float32)
+        path = baseline + alphas[:, np.newaxis, np.newaxis] * (x - baseline)
+        grads = self._input_gradients(path, class_idx).numpy()
+        avg_grads = ((grads[:-1] + grads[1:]) / 2.0).mean(axis=0)  # trapezoid rule
+        return np.abs((x - baseline) * avg_grads)[:, 0]
+
+    def gradcam(self, window: np.ndarray, class_idx: int) -> np.ndarray:
+        x = window.reshape(1, TARGET_LENGTH, 1).astype(np.float32)
+        cam = self._gradcam(x, class_idx).numpy()[0]
+        # Stretch the conv-layer resolution back to one value per sample
+        return np.interp(
+            np.linspace(0, len(cam) - 1, TARGET_LENGTH), np.arange(len(cam)), cam
+        )
+
+    def explain(self, window: np.ndarray, class_idx: int, method: str) -> np.ndarray:
+        """Normalized (186,) heatmap for one preprocessed window."""
+        if method not in GRADIENT_METHODS:
+            raise ValueError(f"Unknown gradient method '{method}'")
+        return normalize_heatmap(getattr(self, method)(window, int(class_idx)))
@@ -0,0 +1,20 @@
+# Picked up automatically by `gunicorn app:app` when run from this directory.
+# Starts the inference replicas (see inference_pool.py) in the master before
+# any worker is forked, and stops them on shutdown.
+from inference_pool import INFERENCE_POOL_REPLICAS, InferencePool
+
+_pool = None
+
+
+def on_starting(server):
+    global _pool
+    if INFERENCE_POOL_REPLICAS > 0:
+        _pool = InferencePool().start()
+        server.log.info(
+            "Inference pool: %d replicas in %s", _pool.replicas, _pool.directory
+        )
+
+
+def on_exit(server):
+    if _pool is not None:
+        _pool.stop()
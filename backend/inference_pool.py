@@ -0,0 +1,378 @@
+"""
+Dedicated model replicas shared by all HTTP workers.
+
+    python inference_pool.py              # standalone, e.g. next to gunicorn
+    INFERENCE_POOL_REPLICAS=2 gunicorn app:app ...   # started by gunicorn.conf.py
+
+Each replica is a separate ("spawn") process that loads the model once,
+optionally pinned to one core with its own TensorFlow intra/inter-op thread
+counts. It owns a shared-memory segment split into slots; a slot holds
+`max_rows` float32 beat windows and the matching probability rows. Each
+connection to a replica (over a Unix socket) is given a slot, and from
+then on only exchanges 4-byte row counts: windows and probabilities never
+go through the socket or pickle. An HTTP worker borrows a connection for
+each predict() call, so any number of threads share a few slots. A
+replica answers all requests that are ready at the same time with one
+forward pass.
+"""
+import json
+import os
+import selectors
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from model_manager import NUM_CLASSES, TARGET_LENGTH
+
+INFERENCE_POOL_REPLICAS = int(os.environ.get("INFERENCE_POOL_REPLICAS", 0))
+INFERENCE_POOL_DIR = os.environ.get(
+    "INFERENCE_POOL_DIR",
+    os.path.join(tempfile.gettempdir(), f"cardioscan-inference-{os.getuid()}"),
+)
+INFERENCE_POOL_SLOTS = int(os.environ.get("INFERENCE_POOL_SLOTS", 32))
+INFERENCE_POOL_MAX_ROWS = int(os.environ.get("INFERENCE_POOL_MAX_ROWS", 256))
+INFERENCE_POOL_IDLE = int(os.environ.get("INFERENCE_POOL_IDLE", 8))
+INFERENCE_POOL_TIMEOUT = float(os.environ.get("INFERENCE_POOL_TIMEOUT", 30))
+INFERENCE_INTRA_OP_THREADS = int(os.environ.get("INFERENCE_INTRA_OP_THREADS", 1))
+INFERENCE_INTER_OP_THREADS = int(os.environ.get("INFERENCE_INTER_OP_THREADS", 1))
+INFERENCE_PIN_CORES = os.environ.get("INFERENCE_PIN_CORES", "true").lower() == "true"
+
+MANIFEST_NAME = "pool.json"
+_COUNT = struct.Struct("<i")
+
+
+def _slot_layout(max_rows):
+    """(input bytes, output bytes) of one slot."""
+    return max_rows * TARGET_LENGTH * 4, max_rows * NUM_CLASSES * 4
+
+
+def _attach_shared_memory(name):
+    """Open an existing segment without letting this process's resource
+    tracker unlink it on exit (the pool owns it)."""
+    from multiprocessing import resource_tracker, shared_memory
+
+    # Replicas and forked gunicorn workers share the owner's tracker, where
+    # the segment is already registered; only a separate tracker must forget it
+    shared_tracker = getattr(resource_tracker._resource_tracker, "_fd", None) is not None
+    shm = shared_memory.SharedMemory(name=name)
+    if not shared_tracker:
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+
+def _slot_views(buf, slot, max_rows):
+    in_bytes, out_bytes = _slot_layout(max_rows)
+    offset = slot * (in_bytes + out_bytes)
+    inputs = np.ndarray((max_rows, TARGET_LENGTH), dtype=np.float32, buffer=buf, offset=offset)
+    outputs = np.ndarray(
+        (max_rows, NUM_CLASSES), dtype=np.float32, buffer=buf, offset=offset + in_bytes
+    )
+    return inputs, outputs
+
+
+def _recv_count(conn):
+    data = conn.recv(_COUNT.size, socket.MSG_WAITALL)
+    if len(data) < _COUNT.size:
+        return None
+    return _COUNT.unpack(data)[0]
+
+
+def configure_threads(backend, intra_op, inter_op):
+    """Per-replica thread counts; must run before the model is loaded."""
+    os.environ.setdefault("TFLITE_NUM_THREADS", str(intra_op))
+    os.environ.setdefault("ONNX_NUM_THREADS", str(intra_op))
+    if backend == "keras":
+        import tensorflow as tf
+
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+
+
+# ---------------------------------------------------------------------------
+# Replica process
+# ---------------------------------------------------------------------------
+def _replica_main(index, socket_path, shm_name, slots, max_rows, core,
+                  intra_op, inter_op, ready):
+    if core is not None:
+        try:
+            os.sched_setaffinity(0, {core})
+        except (AttributeError, OSError):
+            pass
+    backend = os.environ.get("INFERENCE_BACKEND", "keras").lower()
+    configure_threads(backend, intra_op, inter_op)
+
+    from model_manager import ModelManager
+
+    manager = ModelManager(max_batch_size=slots * max_rows).load()
+    shm = _attach_shared_memory(shm_name)
+    views = [_slot_views(shm.buf, slot, max_rows) for slot in range(slots)]
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    free_slots = list(range(slots - 1, -1, -1))
+    slot_of = {}
+    print(f"[INFO] Inference replica {index} ready (pid {os.getpid()}, core {core})")
+    ready.set()
+
+    while True:
+        pending = []
+        for key, _ in selector.select():
+            conn = key.fileobj
+            if conn is listener:
+                conn, _ = listener.accept()
+                if not free_slots:
+                    conn.sendall(_COUNT.pack(-1))
+                    conn.close()
+                    continue
+                slot_of[conn] = free_slots.pop()
+                conn.sendall(_COUNT.pack(slot_of[conn]))
+                selector.register(conn, selectors.EVENT_READ)
+                continue
+            n_rows = _recv_count(conn)
+            if n_rows is None or not 0 < n_rows <= max_rows:
+                selector.unregister(conn)
+                free_slots.append(slot_of.pop(conn))
+                conn.close()
+                continue
+            pending.append((conn, slot_of[conn], n_rows))
+        if not pending:
+            continue
+
+        # One forward pass for every request that arrived together
+        batch = np.concatenate([views[slot][0][:n] for _, slot, n in pending])
+        try:
+            probs = manager.predict(batch[:, :, np.newaxis])
+            status = None
+        except Exception as e:
+            print(f"[ERROR] Inference replica {index}: {e}")
+            probs, status = None, -1
+        start = 0
+        for conn, slot, n in pending:
+            if probs is not None:
+                views[slot][1][:n] = probs[start : start + n]
+                start += n
+            try:
+                conn.sendall(_COUNT.pack(n if status is None else status))
+            except OSError:
+                pass
+
+
+# ---------------------------------------------------------------------------
+# Pool (owner side)
+# ---------------------------------------------------------------------------
+class InferencePool:
+    """Starts and stops the replica processes and their shared memory."""
+
+    def __init__(self, replicas=None, directory=None, slots=None, max_rows=None,
+                 intra_op=None, inter_op=None, pin_cores=None):
+        self.replicas = replicas or INFERENCE_POOL_REPLICAS or 1
+        self.directory = directory or INFERENCE_POOL_DIR
+        self.slots = slots or INFERENCE_POOL_SLOTS
+        self.max_rows = max_rows or INFERENCE_POOL_MAX_ROWS
+        self.intra_op = intra_op or INFERENCE_INTRA_OP_THREADS
+        self.inter_op = inter_op or INFERENCE_INTER_OP_THREADS
+        self.pin_cores = INFERENCE_PIN_CORES if pin_cores is None else pin_cores
+        self._processes = []
+        self._segments = []
+
+    def start(self, timeout=300):
+        import multiprocessing
+        from multiprocessing import shared_memory
+
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            cores = sorted(os.sched_getaffinity(0))
+        except AttributeError:
+            cores = list(range(os.cpu_count() or 1))
+        in_bytes, out_bytes = _slot_layout(self.max_rows)
+        context = multiprocessing.get_context("spawn")
+        manifest = {"max_rows": self.max_rows, "replicas": []}
+        events = []
+        for index in range(self.replicas):
+            socket_path = os.path.join(self.directory, f"replica-{index}.sock")
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            shm = shared_memory.SharedMemory(
+                create=True, size=self.slots * (in_bytes + out_bytes)
+            )
+            self._segments.append(shm)
+            ready = context.Event()
+            core = cores[index % len(cores)] if self.pin_cores else None
+            process = context.Process(
+                target=_replica_main,
+                args=(index, socket_path, shm.name, self.slots, self.max_rows, core,
+                      self.intra_op, self.inter_op, ready),
+                name=f"inference-replica-{index}",
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+            events.append(ready)
+            manifest["replicas"].append({"socket": socket_path, "shm": shm.name})
+
+        deadline = time.monotonic() + timeout
+        for index, (process, ready) in enumerate(zip(self._processes, events)):
+            while not ready.wait(0.2):
+                if not process.is_alive() or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"Inference replica {index} did not start")
+
+        # Written last: clients only see a pool whose replicas are all up
+        tmp_path = os.path.join(self.directory, f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(self.directory, MANIFEST_NAME))
+        return self
+
+    def stop(self):
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        for process in self._processes:
+            process.terminate()
+        for index, process in enumerate(self._processes):
+            process.join(timeout=10)
+            socket_path = os.path.join(self.directory, f"replica-{index}.sock")
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+        for shm in self._segments:
+            shm.close()
+            shm.unlink()
+        self._processes, self._segments = [], []
+
+
+# ---------------------------------------------------------------------------
+# Client (HTTP worker side)
+# ---------------------------------------------------------------------------
+class PoolClient:
+    """
+    `predict(batch, batch_size=None)` against the replicas listed in the
+    pool manifest. Each call borrows a connection (and with it a slot) and
+    gives it back when done; up to `max_idle` returned connections are kept
+    open for reuse. New connections go to the replicas round-robin. When
+    every slot is taken, a call waits up to `timeout` seconds for one.
+    """
+
+    def __init__(self, directory=None, max_idle=None, timeout=None):
+        self.directory = directory or INFERENCE_POOL_DIR
+        self.max_idle = INFERENCE_POOL_IDLE if max_idle is None else max_idle
+        self.timeout = INFERENCE_POOL_TIMEOUT if timeout is None else timeout
+        self._manifest = None
+        self._segments = {}
+        self._idle = []
+        self._returned = threading.Condition()
+        self._lock = threading.Lock()
+        self._next_replica = 0
+        self._pid = None
+
+    @property
+    def available(self) -> bool:
+        return os.path.exists(os.path.join(self.directory, MANIFEST_NAME))
+
+    def _load_manifest(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: sockets and mappings of the parent are not ours
+                self._manifest, self._segments, self._pid = None, {}, os.getpid()
+                self._idle, self._returned = [], threading.Condition()
+            if self._manifest is None:
+                with open(os.path.join(self.directory, MANIFEST_NAME)) as f:
+                    self._manifest = json.load(f)
+            return self._manifest
+
+    def _connect(self):
+        manifest = self._load_manifest()
+        replicas = manifest["replicas"]
+        with self._lock:
+            first = self._next_replica
+            self._next_replica += 1
+        for attempt in range(len(replicas)):
+            replica = replicas[(first + attempt) % len(replicas)]
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(replica["socket"])
+            slot = _recv_count(conn)
+            if slot is None or slot < 0:
+                conn.close()
+                continue  # this replica has no free slot
+            with self._lock:
+                if replica["shm"] not in self._segments:
+                    self._segments[replica["shm"]] = _attach_shared_memory(replica["shm"])
+                shm = self._segments[replica["shm"]]
+            inputs, outputs = _slot_views(shm.buf, slot, manifest["max_rows"])
+            return conn, inputs, outputs
+        raise RuntimeError("Inference pool has no free slot")
+
+    def _acquire(self):
+        """An idle or new connection; waits while every slot is in use."""
+        self._load_manifest()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._returned:
+                if self._idle:
+                    return self._idle.pop()
+            try:
+                return self._connect()
+            except RuntimeError:
+                pass  # all slots taken, by this or other workers
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("Timed out waiting for a free inference pool slot")
+            # Woken by a connection given back here; slots freed by other
+            # processes are picked up by retrying the connect
+            with self._returned:
+                if not self._idle:
+                    self._returned.wait(min(remaining, 0.05))
+
+    def _release(self, connection, broken=False):
+        with self._returned:
+            if not broken and len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                self._returned.notify()
+                return
+        connection[0].close()  # frees the slot on the replica
+
+    def predict(self, batch, batch_size=None) -> np.ndarray:
+        """Class probabilities for a (N, 186, 1) float32 batch."""
+        batch = np.asarray(batch, dtype=np.float32).reshape(len(batch), TARGET_LENGTH)
+        result = np.empty((len(batch), NUM_CLASSES), dtype=np.float32)
+        if len(batch) == 0:
+            return result
+        connection = self._acquire()
+        conn, inputs, outputs = connection
+        max_rows = len(inputs)
+        broken = True
+        try:
+            for start in range(0, len(batch), max_rows):
+                n = min(max_rows, len(batch) - start)
+                inputs[:n] = batch[start : start + n]
+                conn.sendall(_COUNT.pack(n))
+                status = _recv_count(conn)
+                if status != n:
+                    raise RuntimeError("Inference replica failed to process the batch")
+                result[start : start + n] = outputs[:n]
+            broken = False
+        finally:
+            self._release(connection, broken)
+        return result
+
+
+if __name__ == "__main__":
+    pool = InferencePool().start()
+    print(f"[INFO] Inference pool with {pool.replicas} replicas in {pool.directory}")
+    try:
+        while all(p.is_alive() for p in pool._processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
@@ -0,0 +1,150 @@
+"""
+Per-patient state of live ECG streams (the WebSocket endpoint is in asgi.py).
+
+A LiveSession keeps everything one bedside stream needs, and all of it is
+bounded: a ring buffer of the last LIVE_BUFFER_SECONDS of raw samples (for
+the ECG strip attached to alerts) and an incremental RhythmAnalyzer, whose
+segmenter history and rhythm window are fixed-size. Beats are handed out
+for classification and the results fed back, so the caller can batch beats
+of many sessions into one model call.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from rhythm import RhythmAnalyzer
+
+LIVE_MAX_SESSIONS = int(os.environ.get("LIVE_MAX_SESSIONS", 500))
+LIVE_BUFFER_SECONDS = float(os.environ.get("LIVE_BUFFER_SECONDS", 30))
+LIVE_IDLE_TIMEOUT = float(os.environ.get("LIVE_IDLE_TIMEOUT", 60))
+LIVE_MAX_CHUNK_SECONDS = float(os.environ.get("LIVE_MAX_CHUNK_SECONDS", 10))
+LIVE_ALERT_STRIP_SECONDS = float(os.environ.get("LIVE_ALERT_STRIP_SECONDS", 4))
+LIVE_ALERT_EPISODES = frozenset(
+    os.environ.get(
+        "LIVE_ALERT_EPISODES",
+        "ventricular_run,supraventricular_run,bigeminy,trigeminy,tachycardia,bradycardia",
+    ).split(",")
+)
+
+
+class SampleRing:
+    """Fixed-capacity float32 ring buffer of the most recent samples."""
+
+    def __init__(self, capacity):
+        self._data = np.zeros(max(1, int(capacity)), dtype=np.float32)
+        self._next = 0
+        self.total = 0  # samples ever written
+
+    def extend(self, samples):
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        capacity = len(self._data)
+        if len(samples) >= capacity:
+            samples = samples[-capacity:]
+        first = min(len(samples), capacity - self._next)
+        self._data[self._next : self._next + first] = samples[:first]
+        self._data[: len(samples) - first] = samples[first:]
+        self._next = (self._next + len(samples)) % capacity
+        self.total += len(samples)
+
+    def latest(self, n):
+        """The last `n` samples (fewer if not written yet), oldest first."""
+        n = min(int(n), len(self._data), self.total)
+        start = (self._next - n) % len(self._data)
+        if start + n <= len(self._data):
+            return self._data[start : start + n].copy()
+        return np.concatenate((self._data[start:], self._data[: self._next]))
+
+
+class LiveSession:
+    """One patient's stream: ring buffer plus incremental rhythm analysis."""
+
+    def __init__(self, patient_id, fs=125, align="start", emit_beats=True,
+                 class_names=None, buffer_seconds=LIVE_BUFFER_SECONDS):
+        self.patient_id = patient_id
+        self.fs = fs
+        kwargs = {"class_names": class_names} if class_names else {}
+        # Beats are classified by the caller (see segment/add), never here
+        self.analyzer = RhythmAnalyzer(None, fs=fs, align=align, emit_beats=emit_beats, **kwargs)
+        self.ring = SampleRing(buffer_seconds * fs)
+        self.max_chunk = int(LIVE_MAX_CHUNK_SECONDS * fs)
+        self.started = time.time()
+        self.last_seen = self.started
+        self.alerts = 0
+
+    def segment(self, samples=None, final=False):
+        """Store new samples; returns the beats ready for classification."""
+        if not final:
+            samples = np.asarray(samples, dtype=np.float32).ravel()
+            if len(samples) > self.max_chunk:
+                raise ValueError(
+                    f"At most {LIVE_MAX_CHUNK_SECONDS:g} s of samples per message"
+                )
+            self.ring.extend(samples)
+            self.last_seen = time.time()
+        return self.analyzer.segment(samples, final=final)
+
+    def add(self, beats, probabilities, final=False):
+        """Messages for classified beats: beat, alert, episode, window."""
+        messages = []
+        for event in self.analyzer.add(beats, probabilities, final=final):
+            (kind, body), = event.items()
+            if kind == "onset":
+                if body["type"] not in LIVE_ALERT_EPISODES:
+                    continue
+                self.alerts += 1
+                kind = "alert"
+                strip = self.ring.latest(LIVE_ALERT_STRIP_SECONDS * self.fs)
+                body = dict(body, strip=np.round(strip, 4).tolist())
+            messages.append(dict(body, type=kind))
+        if final:
+            messages.append(dict(self.analyzer.summary(), type="summary"))
+        return messages
+
+    def stats(self) -> dict:
+        return {
+            "patient_id": self.patient_id,
+            "fs": self.fs,
+            "seconds": round(self.analyzer.samples_seen / self.fs, 1),
+            "beats": self.analyzer.beat_count,
+            "alerts": self.alerts,
+            "idle_s": round(time.time() - self.last_seen, 1),
+        }
+
+
+class SessionRegistry:
+    """Open sessions of this worker, capped at `max_sessions`."""
+
+    def __init__(self, max_sessions=LIVE_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def open(self, session, owner):
+        """
+        Register `session` for `owner` (e.g. its socket). Returns the owner
+        of an older stream for the same patient, which the caller should
+        close, or raises RuntimeError when the worker is full.
+        """
+        with self._lock:
+            previous = self._sessions.get(session.patient_id)
+            if previous is None and len(self._sessions) >= self.max_sessions:
+                raise RuntimeError("Too many live sessions on this worker")
+            self._sessions[session.patient_id] = (session, owner)
+        return previous[1] if previous else None
+
+    def close(self, session):
+        with self._lock:
+            current = self._sessions.get(session.patient_id)
+            if current is not None and current[0] is session:
+                del self._sessions[session.patient_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = [session for session, _ in self._sessions.values()]
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "streams": [session.stats() for session in sessions],
+        }
@@ -0,0 +1,123 @@
+"""
+Simulated bedside devices for the live ECG endpoint (asgi.py).
+
+    uvicorn asgi:app --port 5000
+    python live_device.py --devices 200 --seconds 60
+
+Each device streams a synthetic record in real time (`--speed` to go
+faster): MIT-BIH beats from the sample dataset, concatenated in the order
+of `--pattern` (N, S, V, F, Q; the default contains a bigeminy stretch).
+Samples go out as float32 binary frames every `--chunk-ms`. At the end the
+devices report beats, alerts and the delay between the sample that
+completed a beat window and that beat's label arriving.
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+
+import numpy as np
+
+import preprocessing
+from sample_store import SampleDataset
+from segmentation import StreamingBeatSegmenter
+
+CLASS_LETTERS = "NSVFQ"
+TARGET_FS = preprocessing.TARGET_FS
+DEFAULT_PATTERN = "NNNNNNNNNN" + "NV" * 4 + "NNNNNNNNNN"
+
+
+def build_record(pattern, seconds, fs=125, seed=0):
+    """
+    Dataset beats (start-aligned at the R-peak, 125 Hz) repeated for
+    `seconds`, resampled to `fs`.
+    """
+    dataset = SampleDataset().load()
+    rng = np.random.default_rng(seed)
+    beats = []
+    total = 0
+    while total < seconds * TARGET_FS:
+        for letter in pattern:
+            row = dataset.random_row(CLASS_LETTERS.index(letter), rng)
+            if row is None:  # class missing from the dataset
+                row = dataset.random_row(rng=rng)
+            signal, _ = dataset.get(row)
+            # Rows are zero-padded after the beat; keep up to the last sample
+            beat = signal[: max(np.flatnonzero(signal).max() + 1, int(0.4 * TARGET_FS))]
+            beats.append(beat.astype(np.float32))
+            total += len(beat)
+    record = np.concatenate(beats)[: int(seconds * TARGET_FS)]
+    return preprocessing.resample(record, TARGET_FS, fs)
+
+
+async def run_device(url, patient_id, record, fs, chunk, interval, stats):
+    import websockets
+
+    # Samples after the peak before the server can cut the beat's window
+    window_post = StreamingBeatSegmenter(fs=fs).post
+    async with websockets.connect(f"{url}/ws/live/{patient_id}?fs={fs:g}") as socket:
+        start = time.perf_counter()
+
+        async def send():
+            for n, offset in enumerate(range(0, len(record), chunk)):
+                delay = start + n * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await socket.send(record[offset : offset + chunk].astype("<f4").tobytes())
+            await socket.send(json.dumps({"type": "end"}))
+
+        async def receive():
+            async for raw in socket:
+                message = json.loads(raw)
+                kind = message["type"]
+                stats[kind] = stats.get(kind, 0) + 1
+                if kind == "beat":
+                    # Send time of the chunk that completed this beat's window
+                    completed = math.ceil((message["sample"] + window_post) / chunk) - 1
+                    sent = start + max(completed, 0) * interval
+                    stats["latencies"].append(time.perf_counter() - sent)
+                elif kind == "summary":
+                    return
+
+        await asyncio.gather(send(), receive())
+
+
+async def main_async(args):
+    record = build_record(args.pattern, args.seconds, args.fs)
+    chunk = max(1, int(args.fs * args.chunk_ms / 1000))
+    interval = chunk / args.fs / args.speed
+    stats = {"latencies": []}
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            run_device(args.url, f"sim-{i}", record, args.fs, chunk, interval, stats)
+            for i in range(args.devices)
+        ),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - started
+    errors = [r for r in results if isinstance(r, Exception)]
+    latencies = np.asarray(stats.pop("latencies")) * 1000
+    print(f"devices: {args.devices} ({len(errors)} failed), {elapsed:.1f} s")
+    print(f"messages: {stats}")
+    if len(latencies):
+        print(
+            "beat label delay (ms): "
+            f"p50 {np.percentile(latencies, 50):.1f}  p95 {np.percentile(latencies, 95):.1f}  "
+            f"max {latencies.max():.1f}"
+        )
+    for error in errors[:5]:
+        print(f"error: {error!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="ws://127.0.0.1:5000")
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--fs", type=float, default=125)
+    parser.add_argument("--chunk-ms", type=float, default=200)
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed factor")
+    parser.add_argument("--pattern", default=DEFAULT_PATTERN)
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Bucket widths for the explanation features; the prompt is built from the
+# bucketed values, so a cached answer is exact for every request in a bucket.
+BPM_BUCKET = int(os.environ.get("LLM_CACHE_BPM_BUCKET", 5))
+RR_BUCKET_MS = int(os.environ.get("LLM_CACHE_RR_BUCKET_MS", 20))
+AMPLITUDE_BUCKET = float(os.environ.get("LLM_CACHE_AMPLITUDE_BUCKET", 0.05))
+CONFIDENCE_BUCKET = float(os.environ.get("LLM_CACHE_CONFIDENCE_BUCKET", 5))
+
+
+def _bucket(value, width):
+    return round(round(float(value) / width) * width, 6)
+
+
+def bucket_features(feats: dict) -> dict:
+    """`bpm`, `rr_avg` and `amplitude` of extract_features(), snapped to buckets."""
+    return {
+        "bpm": int(_bucket(feats["bpm"], BPM_BUCKET)),
+        "rr_avg": int(_bucket(feats["rr_avg"], RR_BUCKET_MS)),
+        "amplitude": _bucket(feats["amplitude"], AMPLITUDE_BUCKET),
+    }
+
+
+def bucket_context(context):
+    """Chat context with the confidence snapped to a bucket (None stays None)."""
+    if not context:
+        return context
+    context = dict(context)
+    try:
+        context["confidence"] = _bucket(context["confidence"], CONFIDENCE_BUCKET)
+    except (KeyError, TypeError, ValueError):
+        pass
+    return context
+
+
+def normalize_question(text: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the answer."""
+    return re.sub(r"\s+", " ", str(text)).strip().rstrip("?!. ").lower()
+
+
+class LLMResponseCache:
+    """
+    LLM answers persisted in a local SQLite file, shared by all workers.
+
+    Keys are SHA-256 hashes of the (already bucketed/normalized) inputs.
+    Entries expire after `ttl_seconds`; beyond `max_entries` the least
+    recently used ones are evicted. Hit/miss counters are per process.
+    `max_entries=0` disables the cache.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttl_seconds=None):
+        self.path = path or os.environ.get(
+            "LLM_CACHE_PATH", os.path.join(BACKEND_DIR, "llm_cache.sqlite3")
+        )
+        self.max_entries = (
+            max_entries
+            if max_entries is not None
+            else int(os.environ.get("LLM_CACHE_SIZE", 2048))
+        )
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.environ.get("LLM_CACHE_TTL", 7 * 24 * 3600))
+        )
+        self.hits = self.misses = self.evictions = 0
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def _db(self):
+        # One connection per process (sqlite connections must not cross fork)
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key):
+        """Cached answer or None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._db()
+                row = db.execute(
+                    "SELECT response, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    db.commit()
+                    row = None
+                if row is None:
+                    self.misses += 1
+                    return None
+                db.execute(
+                    "UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                    (now, key),
+                )
+                db.commit()
+            except sqlite3.Error:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        if not self.enabled or not response:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created, last_used)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, response, now, now),
+                )
+                excess = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    db.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        " SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                        (excess,),
+                    )
+                    self.evictions += excess
+                db.commit()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> dict:
+        entries = 0
+        if self.enabled:
+            with self._lock:
+                try:
+                    entries = self._db().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
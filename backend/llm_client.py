@@ -0,0 +1,241 @@
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+LLM_MODEL = os.environ.get("LLM_MODEL", "llama-3.3-70b-versatile")
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", 20))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 20))
+
+SYSTEM_PROMPT = (
+    "You are HeartAI, a helpful medical AI assistant specializing in "
+    "ECG analysis and cardiac arrhythmias. You provide clear, accurate, "
+    "and educational information about heart conditions, ECG "
+    "interpretations, and arrhythmia types. Always remind users to "
+    "consult healthcare professionals for medical decisions. "
+    "Keep responses concise but informative. Use markdown formatting."
+)
+
+ERROR_PREFIX = "Error communicating with LLM:"
+
+NOT_CONFIGURED_MESSAGE = (
+    "LLM integration is not configured. Please set the GROQ_API_KEY "
+    "environment variable to enable AI-powered insights."
+)
+
+
+def is_error_text(text) -> bool:
+    """True for the placeholder/error texts returned instead of an answer."""
+    return not text or text.startswith(ERROR_PREFIX) or text == NOT_CONFIGURED_MESSAGE
+
+
+def build_messages(user_message, context=None):
+    """Chat messages for a HeartAI question, with optional ECG analysis context."""
+    context_str = ""
+    if context:
+        context_str = (
+            f"\n\nCurrent ECG Analysis Context:\n"
+            f"- Detected beat type: {context.get('beat_type', 'N/A')}\n"
+            f"- Confidence: {context.get('confidence', 'N/A')}\n"
+            f"- Severity: {context.get('severity', 'N/A')}\n"
+        )
+    full_prompt = f"{context_str}\n\nUser question: {user_message}"
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": full_prompt},
+    ]
+
+
+class LLMClient:
+    """
+    One pooled AsyncGroq client per worker process, driven by a private
+    event loop thread.
+
+    Request threads hand completions to the loop with `submit()` and get a
+    concurrent.futures.Future back, so they can do other work (e.g. the
+    explanation heatmap) while the HTTP call is in flight, and any number
+    of waiting requests share one keep-alive connection pool instead of
+    opening a new client per call. Every call is bounded by `timeout`.
+    GROQ_BASE_URL points the client elsewhere, e.g. at llm_stub.py.
+    """
+
+    def __init__(self, api_key=None, base_url=None, model=LLM_MODEL,
+                 timeout=LLM_TIMEOUT_SECONDS, max_connections=LLM_MAX_CONNECTIONS):
+        self.api_key = api_key or os.environ.get("GROQ_API_KEY")
+        self.base_url = base_url or os.environ.get("GROQ_BASE_URL") or None
+        self.model = model
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._loop = None
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _ensure_loop(self):
+        # Also restarts the loop in a forked worker (threads do not survive fork)
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="llm-client", daemon=True
+            ).start()
+            self._loop, self._client, self._pid = loop, None, os.getpid()
+            return loop
+
+    def _get_client(self):
+        # Called on the loop thread, so the pool is bound to that loop
+        if self._client is None:
+            import httpx
+            from groq import AsyncGroq
+
+            self._client = AsyncGroq(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=1,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    ),
+                    timeout=self.timeout,
+                ),
+            )
+        return self._client
+
+    async def acomplete(self, messages, temperature=0.5, max_tokens=512) -> str:
+        completion = await self._get_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1,
+            stream=False,
+            stop=None,
+        )
+        return completion.choices[0].message.content
+
+    def submit(self, messages, **kwargs):
+        """Start a completion on the client loop; returns a Future of the text."""
+        return asyncio.run_coroutine_threadsafe(
+            self.acomplete(messages, **kwargs), self._ensure_loop()
+        )
+
+    def start(self, user_message, context=None):
+        """Start answering a HeartAI question in the background (a Future)."""
+        if not self.configured:
+            future = Future()
+            future.set_result(NOT_CONFIGURED_MESSAGE)
+            return future
+        return self.submit(build_messages(user_message, context))
+
+    def result(self, future) -> str:
+        """Wait for a submitted completion; errors become a readable message."""
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            return f"{ERROR_PREFIX} no response within {self.timeout:g} s"
+        except Exception as e:
+            return f"{ERROR_PREFIX} {str(e)}"
+
+    async def _astream(self, messages, put, temperature=0.5, max_tokens=512):
+        """Feed text pieces, then None (end) or the exception, to `put`."""
+        try:
+            stream = await self._get_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=1,
+                stream=True,
+                stop=None,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    put(chunk.choices[0].delta.content)
+            put(None)
+        except Exception as e:
+            put(e)
+
+    def stream(self, user_message, context=None):
+        """
+        Start a streamed answer now; returns an iterator over text pieces as
+        they arrive. `timeout` bounds the wait for each piece, and errors are
+        yielded as a final readable message.
+        """
+        if not self.configured:
+            return iter([NOT_CONFIGURED_MESSAGE])
+        chunks = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._astream(build_messages(user_message, context), chunks.put),
+            self._ensure_loop(),
+        )
+        return self._iter_chunks(chunks, future)
+
+    def _iter_chunks(self, chunks, future):
+        try:
+            while True:
+                try:
+                    piece = chunks.get(timeout=self.timeout)
+                except queue.Empty:
+                    yield f"{ERROR_PREFIX} no response within {self.timeout:g} s"
+                    return
+                if piece is None:
+                    return
+                if isinstance(piece, Exception):
+                    yield f"{ERROR_PREFIX} {str(piece)}"
+                    return
+                yield piece
+        finally:
+            future.cancel()  # client disconnected or timed out: stop reading
+
+    # -- awaitable API for callers running their own event loop (asgi.py) --
+    async def aresult(self, future) -> str:
+        """Await a submitted completion without blocking a thread."""
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            return f"{ERROR_PREFIX} no response within {self.timeout:g} s"
+        except Exception as e:
+            return f"{ERROR_PREFIX} {str(e)}"
+
+    async def astream(self, user_message, context=None):
+        """Async iterator version of stream()."""
+        if not self.configured:
+            yield NOT_CONFIGURED_MESSAGE
+            return
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._astream(
+                build_messages(user_message, context),
+                lambda item: loop.call_soon_threadsafe(chunks.put_nowait, item),
+            ),
+            self._ensure_loop(),
+        )
+        try:
+            while True:
+                try:
+                    piece = await asyncio.wait_for(chunks.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    yield f"{ERROR_PREFIX} no response within {self.timeout:g} s"
+                    return
+                if piece is None:
+                    return
+                if isinstance(piece, Exception):
+                    yield f"{ERROR_PREFIX} {str(piece)}"
+                    return
+                yield piece
+        finally:
+            future.cancel()
+
+    def complete(self, user_message, context=None) -> str:
+        """Blocking convenience wrapper: start and wait."""
+        return self.result(self.start(user_message, context))
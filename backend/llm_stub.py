@@ -0,0 +1,130 @@
+"""
+Local stand-in for the Groq chat completions API, for tests and load runs.
+
+    python llm_stub.py --port 8765 --delay 1.5
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=stub python app.py
+
+Every completion answers after `--delay` seconds with a canned reply that
+echoes the end of the user prompt; streamed requests get it word by word,
+`--token-delay` seconds apart.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # many concurrent clients connect at once
+
+
+def make_handler(delay=0.0, token_delay=0.0):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client gave up (timeout test)
+
+        def _send_stream(self, model, content):
+            """Server-sent events, one chunk per word, like the streaming API."""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            pieces = [word + " " for word in content.split(" ")]
+            try:
+                for i, piece in enumerate(pieces + [None]):
+                    if piece is None:
+                        event = "data: [DONE]\n\n"
+                    else:
+                        chunk = {
+                            "id": "chatcmpl-stub",
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": model,
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "delta": {"content": piece},
+                                    "finish_reason": "stop" if i == len(pieces) - 1 else None,
+                                }
+                            ],
+                        }
+                        event = f"data: {json.dumps(chunk)}\n\n"
+                        time.sleep(token_delay)
+                    data = event.encode()
+                    self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self.path != COMPLETIONS_PATH:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            time.sleep(delay)
+            prompt = request.get("messages", [{}])[-1].get("content", "")
+            content = f"Stub answer to: {prompt[-80:]}"
+            if request.get("stream"):
+                self._send_stream(request.get("model", "stub"), content)
+                return
+            self._send_json(
+                200,
+                {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "stub"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": content,
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                },
+            )
+
+    return StubHandler
+
+
+def start_stub_server(host="127.0.0.1", port=0, delay=0.0, token_delay=0.0):
+    """Serve the stub on a background thread; returns (server, base_url)."""
+    server = StubServer((host, port), make_handler(delay, token_delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=1.0, help="seconds per completion")
+    parser.add_argument("--token-delay", type=float, default=0.05,
+                        help="seconds between streamed words")
+    args = parser.parse_args()
+    server = StubServer((args.host, args.port), make_handler(args.delay, args.token_delay))
+    print(f"[INFO] LLM stub listening on http://{args.host}:{args.port}")
+    server.serve_forever()
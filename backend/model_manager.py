@@ -0,0 +1,398 @@
+import gc
+import os
+import threading
+
+import numpy as np
+
+TARGET_LENGTH = 186
+NUM_CLASSES = 5
+BACKEND_DIR = os.path.dirname(__file__)
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+def _current_rss_mb() -> float:
+    """Resident set size of this process in MB (0 if it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+
+            # ru_maxrss is KB on Linux; this is the peak, good enough as a fallback
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        except Exception:
+            return 0.0
+
+
+# ---------------------------------------------------------------------------
+# Inference backends
+# Each backend exposes load() and predict(batch) -> float32 probabilities,
+# where batch is a float32 array of shape (N, 186, 1).
+# ---------------------------------------------------------------------------
+class KerasBackend:
+    """Keras model wrapped in a traced tf.function with a fixed signature."""
+
+    name = "keras"
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or os.environ.get(
+            "MODEL_PATH", os.path.join(BACKEND_DIR, "best_model.h5")
+        )
+        self.keras_model = None
+        self._infer = None
+
+    def load(self):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model  # noqa: E402
+
+        model = load_model(self.model_path, compile=False)
+
+        @tf.function(
+            input_signature=[
+                tf.TensorSpec(shape=(None, TARGET_LENGTH, 1), dtype=tf.float32)
+            ],
+            reduce_retracing=True,
+        )
+        def infer(x):
+            return model(x, training=False)
+
+        self.keras_model = model
+        self._infer = infer
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self._infer(batch).numpy()
+
+
+def _tflite_interpreter_class():
+    """Prefer the standalone TFLite runtimes so CPU pods can skip TensorFlow."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend:
+    """
+    TFLite interpreter backend (see convert.py for producing model.tflite).
+
+    Interpreters are not thread-safe, so every thread gets its own, and the
+    input tensor is resized whenever the batch size changes.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path=None, num_threads=None):
+        self.model_path = model_path or os.environ.get(
+            "TFLITE_MODEL_PATH", os.path.join(BACKEND_DIR, "model.tflite")
+        )
+        self.num_threads = num_threads or int(os.environ.get("TFLITE_NUM_THREADS", 1))
+        self._local = threading.local()
+        self._interpreter_class = None
+
+    def _interpreter(self):
+        local = self._local
+        if getattr(local, "interpreter", None) is None:
+            interpreter = self._interpreter_class(
+                model_path=self.model_path, num_threads=self.num_threads
+            )
+            interpreter.allocate_tensors()
+            local.interpreter = interpreter
+            local.input = interpreter.get_input_details()[0]
+            local.output = interpreter.get_output_details()[0]
+            local.batch_size = int(local.input["shape"][0])
+        return local
+
+    def load(self):
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(
+                f"{self.model_path} not found. Run convert.py to create it."
+            )
+        self._interpreter_class = _tflite_interpreter_class()
+        self._interpreter()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        local = self._interpreter()
+        interpreter = local.interpreter
+        if len(batch) != local.batch_size:
+            interpreter.resize_tensor_input(
+                local.input["index"], [len(batch), TARGET_LENGTH, 1]
+            )
+            interpreter.allocate_tensors()
+            local.batch_size = len(batch)
+        interpreter.set_tensor(local.input["index"], batch.astype(local.input["dtype"]))
+        interpreter.invoke()
+        return interpreter.get_tensor(local.output["index"]).astype(np.float32)
+
+
+class OnnxBackend:
+    """ONNX Runtime backend (optional, requires `onnxruntime` and model.onnx)."""
+
+    name = "onnx"
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or os.environ.get(
+            "ONNX_MODEL_PATH", os.path.join(BACKEND_DIR, "model.onnx")
+        )
+        self._session = None
+        self._input_name = None
+
+    def load(self):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError(
+                "INFERENCE_BACKEND=onnx requires the onnxruntime package"
+            )
+        options = ort.SessionOptions()
+        num_threads = int(os.environ.get("ONNX_NUM_THREADS", 0))
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        # InferenceSession.run is thread-safe, so one session is shared
+        self._session = ort.InferenceSession(
+            self.model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_name = self._session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        outputs = self._session.run(None, {self._input_name: batch})
+        return np.asarray(outputs[0], dtype=np.float32)
+
+
+def _activation(x, name):
+    if name == "relu":
+        return np.maximum(x, 0, out=x)
+    if name == "softmax":
+        x = np.exp(x - x.max(axis=-1, keepdims=True))
+        return x / x.sum(axis=-1, keepdims=True)
+    if name in (None, "linear"):
+        return x
+    raise ValueError(f"Unsupported activation '{name}' in model snapshot")
+
+
+def _same_padding(length, window, stride):
+    """(before, after) padding of TensorFlow's 'same' mode."""
+    out = -(-length // stride)
+    total = max((out - 1) * stride + window - length, 0)
+    return total // 2, total - total // 2
+
+
+def _conv1d(x, kernel, bias, stride, padding):
+    # x: (N, L, C_in), kernel: (width, C_in, C_out)
+    width = kernel.shape[0]
+    if padding == "same":
+        x = np.pad(x, ((0, 0), _same_padding(x.shape[1], width, stride), (0, 0)))
+    windows = np.lib.stride_tricks.sliding_window_view(x, width, axis=1)[:, ::stride]
+    # im2col: (N * L_out, width * C_in) @ (width * C_in, C_out) in one matmul
+    n, length = windows.shape[:2]
+    columns = windows.transpose(0, 1, 3, 2).reshape(n * length, -1)
+    out = (columns @ kernel.reshape(-1, kernel.shape[2])).reshape(n, length, -1)
+    return out + bias if bias is not None else out
+
+
+def _max_pool1d(x, pool, stride, padding):
+    if padding == "same":
+        x = np.pad(
+            x, ((0, 0), _same_padding(x.shape[1], pool, stride), (0, 0)),
+            constant_values=-np.inf,
+        )
+    length = (x.shape[1] - pool) // stride + 1
+    end = (length - 1) * stride + 1
+    out = x[:, 0:end:stride].copy()
+    for offset in range(1, pool):
+        np.maximum(out, x[:, offset : offset + end : stride], out=out)
+    return out
+
+
+class SnapshotBackend:
+    """
+    NumPy forward pass over a weight snapshot of the Keras model.
+
+    `python convert.py --snapshot` writes model_snapshot.npz (layer specs and
+    weights). Loading it takes milliseconds and does not import TensorFlow,
+    so a new pod serves predictions long before TensorFlow would be imported.
+    Supports the layer types of best_model.h5 (Conv1D, BatchNormalization,
+    MaxPooling1D, Flatten, Dense, Dropout).
+    """
+
+    name = "snapshot"
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or os.environ.get(
+            "SNAPSHOT_MODEL_PATH", os.path.join(BACKEND_DIR, "model_snapshot.npz")
+        )
+        self._layers = None
+
+    def load(self):
+        import json
+
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(
+                f"{self.model_path} not found. Run convert.py --snapshot to create it."
+            )
+        with np.load(self.model_path, allow_pickle=False) as snapshot:
+            specs = json.loads(str(snapshot["layers"]))
+            self._layers = [
+                (
+                    spec,
+                    [
+                        snapshot[f"layer{i}_weight{j}"].astype(np.float32)
+                        for j in range(spec["n_weights"])
+                    ],
+                )
+                for i, spec in enumerate(specs)
+            ]
+        # Fold batch normalization into a scale and shift once
+        for spec, weights in self._layers:
+            if spec["type"] == "BatchNormalization":
+                gamma, beta, mean, var = weights
+                scale = gamma / np.sqrt(var + spec["epsilon"])
+                weights[:] = [scale, beta - mean * scale]
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        x = batch
+        for spec, weights in self._layers:
+            kind = spec["type"]
+            if kind == "Conv1D":
+                x = _conv1d(x, weights[0], weights[1] if len(weights) > 1 else None,
+                            spec["strides"], spec["padding"])
+                x = _activation(x, spec["activation"])
+            elif kind == "BatchNormalization":
+                x = x * weights[0]
+                x += weights[1]
+            elif kind == "MaxPooling1D":
+                x = _max_pool1d(x, spec["pool_size"], spec["strides"], spec["padding"])
+            elif kind == "Flatten":
+                x = x.reshape(len(x), -1)
+            elif kind == "Dense":
+                x = x @ weights[0]
+                if len(weights) > 1:
+                    x = x + weights[1]
+                x = _activation(x, spec["activation"])
+        return np.asarray(x, dtype=np.float32)
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    OnnxBackend.name: OnnxBackend,
+    SnapshotBackend.name: SnapshotBackend,
+}
+
+
+class ModelManager:
+    """
+    Keeps one inference backend resident per worker process.
+
+    The backend is chosen with INFERENCE_BACKEND (keras, tflite, onnx or
+    snapshot), loaded once and warmed with a dummy batch, so requests never
+    pay for loading or graph retracing. Memory is bounded by capping the rows per
+    forward pass and by collecting garbage only when the process grows past
+    an explicit budget, instead of clearing the Keras session.
+    """
+
+    def __init__(self, backend=None, max_batch_size=None, memory_budget_mb=None):
+        backend = backend or os.environ.get("INFERENCE_BACKEND", "keras").lower()
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown INFERENCE_BACKEND '{backend}'. "
+                f"Choose one of: {', '.join(BACKENDS)}"
+            )
+        self.backend = BACKENDS[backend]()
+        self.max_batch_size = max_batch_size or int(
+            os.environ.get("MODEL_MAX_BATCH_SIZE", 1024)
+        )
+        self.memory_budget_mb = (
+            memory_budget_mb
+            if memory_budget_mb is not None
+            else float(os.environ.get("MODEL_MEMORY_BUDGET_MB", 0))
+        )
+        self._ready = False
+        self._keras_fallback = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @property
+    def model_path(self) -> str:
+        return self.backend.model_path
+
+    @property
+    def version(self) -> str:
+        """Identifies the model weights (backend, file name, size, mtime)."""
+        try:
+            st = os.stat(self.model_path)
+            stamp = f"{st.st_size}:{st.st_mtime_ns}"
+        except OSError:
+            stamp = "missing"
+        return f"{self.backend.name}:{os.path.basename(self.model_path)}:{stamp}"
+
+    def load(self):
+        """Load the backend and run a dummy batch so the first request is warm."""
+        with self._lock:
+            if self._ready:
+                return self
+            self.backend.load()
+            self.backend.predict(np.zeros((1, TARGET_LENGTH, 1), dtype=np.float32))
+            self._ready = True
+            print(
+                f"[INFO] Model loaded and warmed from {self.model_path} "
+                f"({self.backend.name} backend)"
+            )
+        return self
+
+    def keras_model(self):
+        """
+        The underlying Keras model, needed for gradient-based explanations.
+        Non-Keras backends load it from MODEL_PATH on first use.
+        """
+        if not self._ready:
+            self.load()
+        if isinstance(self.backend, KerasBackend):
+            return self.backend.keras_model
+        with self._lock:
+            if self._keras_fallback is None:
+                fallback = KerasBackend()
+                fallback.load()
+                self._keras_fallback = fallback
+        return self._keras_fallback.keras_model
+
+    def predict(self, batch, batch_size=None) -> np.ndarray:
+        """Return class probabilities for a (N, 186, 1) batch as float32."""
+        if not self._ready:
+            self.load()
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if len(batch) == 0:
+            return np.zeros((0, NUM_CLASSES), dtype=np.float32)
+        chunk = min(batch_size or self.max_batch_size, self.max_batch_size)
+        if len(batch) <= chunk:
+            return self.backend.predict(batch)
+        outputs = [
+            self.backend.predict(batch[i : i + chunk])
+            for i in range(0, len(batch), chunk)
+        ]
+        return np.concatenate(outputs, axis=0)
+
+    def enforce_memory_budget(self):
+        """Collect garbage only when the process exceeds its memory budget."""
+        if self.memory_budget_mb <= 0:
+            return False
+        if _current_rss_mb() <= self.memory_budget_mb:
+            return False
+        gc.collect()
+        return True
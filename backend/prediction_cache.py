@@ -0,0 +1,195 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Class probabilities keyed by SHA-256(model version + float32 model input).
+
+    The in-process tier is an LRU of at most `max_entries` items, each valid
+    for `ttl_seconds`. With `disk_dir` set, entries are also written there
+    as small .npy files so every worker process (e.g. several gunicorn
+    workers) can reuse them; pointing it at /dev/shm keeps that tier in
+    shared memory. `max_entries=0` disables caching. Batches of more than
+    `store_max_rows` rows are looked up but not added, so a large batch
+    upload cannot flush the entries of interactive requests.
+    """
+
+    def __init__(self, max_entries=None, ttl_seconds=None, disk_dir=None,
+                 prune_every=1024, store_max_rows=None):
+        self.max_entries = (
+            max_entries
+            if max_entries is not None
+            else int(os.environ.get("PREDICTION_CACHE_SIZE", 4096))
+        )
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.environ.get("PREDICTION_CACHE_TTL", 3600))
+        )
+        self.disk_dir = disk_dir or os.environ.get("PREDICTION_CACHE_DIR") or None
+        self.store_max_rows = (
+            store_max_rows
+            if store_max_rows is not None
+            else int(os.environ.get("PREDICTION_CACHE_MAX_BATCH", 32))
+        )
+        self.prune_every = prune_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(window: np.ndarray, version: str) -> str:
+        digest = hashlib.sha256(version.encode())
+        digest.update(b"\0")
+        digest.update(np.ascontiguousarray(window, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    # -- disk tier ----------------------------------------------------------
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npy")
+
+    def _disk_get(self, key):
+        path = self._disk_path(key)
+        try:
+            if self.ttl_seconds > 0 and time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                return None
+            return np.load(path)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, probs):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, probs)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self._disk_writes += 1
+        if self._disk_writes % self.prune_every == 0:
+            self.prune_disk()
+
+    def prune_disk(self):
+        """Remove expired entries from the disk tier."""
+        if not self.disk_dir or self.ttl_seconds <= 0:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    # -- lookups --------------------------------------------------------------
+    def get(self, key):
+        """Cached probabilities for a key, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, probs = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return probs
+                del self._entries[key]
+        probs = self._disk_get(key) if self.disk_dir else None
+        with self._lock:
+            if probs is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, probs)
+        return probs
+
+    def _remember(self, key, probs):
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else float("inf")
+        with self._lock:
+            self._entries[key] = (expires_at, probs)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def put(self, key, probs):
+        probs = np.array(probs, dtype=np.float32)
+        probs.setflags(write=False)
+        self._remember(key, probs)
+        if self.disk_dir:
+            self._disk_put(key, probs)
+
+    def predict(self, batch, predict_fn, version, batch_size=None,
+                cached_rows=None) -> np.ndarray:
+        """
+        Probabilities for a (N, 186, 1) batch; only rows that miss the cache
+        are passed (as one batch) to `predict_fn(batch, batch_size)`.
+
+        Only the first `cached_rows` rows (default: all) use the cache; the
+        rest always run, e.g. the one-off occlusions of an explanation.
+        """
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        n_cached = len(batch) if cached_rows is None else min(cached_rows, len(batch))
+        if not self.enabled or n_cached == 0:
+            return predict_fn(batch, batch_size)
+
+        keys = [self.key(window, version) for window in batch[:n_cached]]
+        cached = [self.get(key) for key in keys] + [None] * (len(batch) - n_cached)
+        missing = [i for i, probs in enumerate(cached) if probs is None]
+        if not missing:
+            return np.stack(cached)
+
+        predictions = predict_fn(batch[missing], batch_size)
+        store = n_cached <= self.store_max_rows
+        for i, probs in zip(missing, predictions):
+            if store and i < n_cached:
+                self.put(keys[i], probs)
+            cached[i] = probs
+        return np.stack(cached).astype(np.float32, copy=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "store_max_rows": self.store_max_rows,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_dir": self.disk_dir,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+class CachedPredictor:
+    """Model-like wrapper (`predict(batch, batch_size=None)`) backed by a PredictionCache."""
+
+    def __init__(self, predict_fn, cache, version_fn):
+        self.predict_fn = predict_fn
+        self.cache = cache
+        self.version_fn = version_fn
+
+    def predict(self, batch, batch_size=None, cached_rows=None) -> np.ndarray:
+        return self.cache.predict(
+            batch, self.predict_fn, self.version_fn(), batch_size, cached_rows
+        )
@@ -4,28 +4,111 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 import io
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import os
+import threading
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
 from datetime import datetime
+from xml.sax.saxutils import escape
+
+from model_manager import available_cpus
+
+# ---------------------------------------------------------------------------
+# Static report assets, built once at import time
+# ---------------------------------------------------------------------------
+STYLES = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=STYLES['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#1e293b'),
+    spaceAfter=20,
+    alignment=1  # Center
+)
+
+SUBTITLE_STYLE = ParagraphStyle(
+    'CustomSubtitle',
+    parent=STYLES['Heading2'],
+    fontSize=14,
+    textColor=colors.HexColor('#64748b'),
+    spaceAfter=10
+)
+
+DISCLAIMER_STYLE = ParagraphStyle(
+    'Disclaimer',
+    parent=STYLES['Normal'],
+    fontSize=8,
+    textColor=colors.HexColor('#94a3b8'),
+    alignment=1
+)
+
+SEVERITY_COLORS = {
+    'normal': colors.HexColor('#10b981'),  # Green
+    'warning': colors.HexColor('#f59e0b'), # Amber
+    'danger': colors.HexColor('#ef4444'),  # Red
+    'caution': colors.HexColor('#f97316'), # Orange
+    'unknown': colors.HexColor('#64748b')  # Slate
+}
+
+SUMMARY_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (1, 0), colors.HexColor('#f1f5f9')),
+    ('TEXTCOLOR', (0, 0), (1, 0), colors.HexColor('#334155')),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+    ('FONTNAME', (1, 3), (1, 3), 'Helvetica-Bold'),
+]
+
+# Flowables hold layout state, so every report builds its own Paragraph
+DISCLAIMER_TEXT = (
+    "DISCLAIMER: This report is generated by an AI algorithm (CardioScan) and is for educational/research purposes only. "
+    "It is NOT a medical diagnosis. Please create an appointment with a cardiologist for professional evaluation."
+)
+
+# ---------------------------------------------------------------------------
+# Plotting (object-oriented Agg API, no pyplot global state)
+# ---------------------------------------------------------------------------
+_plot_state = threading.local()
+
+
+def _get_plot():
+    """One reusable figure/canvas per thread."""
+    if getattr(_plot_state, 'figure', None) is None:
+        figure = Figure(figsize=(8, 3), dpi=150)
+        canvas = FigureCanvasAgg(figure)
+        ax = figure.add_subplot(1, 1, 1)
+        line, = ax.plot([], [], color='#ef4444', linewidth=1.5)
+        ax.grid(True, linestyle='--', alpha=0.3)
+        ax.set_xlabel('Time (samples)', fontsize=8)
+        ax.set_ylabel('Amplitude', fontsize=8)
+        _plot_state.figure, _plot_state.canvas = figure, canvas
+        _plot_state.ax, _plot_state.line = ax, line
+    return _plot_state
+
 
 def create_ecg_plot(signal, title="ECG Waveform"):
-    """Create a matplotlib plot of the ECG signal and return it as a BytesIO buffer."""
-    plt.figure(figsize=(8, 3))
-    plt.plot(signal, color='#ef4444', linewidth=1.5)
-    plt.grid(True, linestyle='--', alpha=0.3)
-    plt.title(title, fontsize=10)
-    plt.xlabel('Time (samples)', fontsize=8)
-    plt.ylabel('Amplitude', fontsize=8)
-    plt.tight_layout()
-    
+    """Create a plot of the ECG signal and return it as a PNG BytesIO buffer."""
+    plot = _get_plot()
+    signal = np.asarray(signal, dtype=np.float64)
+    plot.line.set_data(np.arange(len(signal)), signal)
+    plot.ax.relim()
+    plot.ax.autoscale_view()
+    plot.ax.set_title(title, fontsize=10)
+    # Lay out after the title and tick labels for this signal are known
+    plot.figure.tight_layout()
+
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=150)
-    plt.close()
+    plot.canvas.print_png(buf)
     buf.seek(0)
     return buf
 
+
 def generate_pdf_report(data):
     """
     Generate a PDF medical report for ECG analysis.
@@ -40,93 +123,93 @@ def generate_pdf_report(data):
     """
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    
-    # Custom Styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1e293b'),
-        spaceAfter=20,
-        alignment=1  # Center
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#64748b'),
-        spaceAfter=10
-    )
-    
+
     elements = []
-    
+
     # Header
-    elements.append(Paragraph("CardioScan Analysis Report", title_style))
-    elements.append(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
+    generated_on = data.get('timestamp') or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    elements.append(Paragraph("CardioScan Analysis Report", TITLE_STYLE))
+    elements.append(Paragraph(f"Generated on: {escape(str(generated_on))}", STYLES['Normal']))
     elements.append(Spacer(1, 20))
-    
+
     # Summary Table
-    severity_color = {
-        'normal': colors.HexColor('#10b981'),  # Green
-        'warning': colors.HexColor('#f59e0b'), # Amber
-        'danger': colors.HexColor('#ef4444'),  # Red
-        'caution': colors.HexColor('#f97316'), # Orange
-        'unknown': colors.HexColor('#64748b')  # Slate
-    }.get(data.get('severity', 'unknown'), colors.black)
+    severity = str(data.get('severity', 'Unknown'))
+    severity_color = SEVERITY_COLORS.get(severity.lower(), colors.black)
 
     summary_data = [
         ['Parameter', 'Value'],
-        ['Detected Condition', Paragraph(f"<b>{data.get('beat_type', 'N/A')}</b>", styles['Normal'])],
+        ['Detected Condition', Paragraph(f"<b>{escape(str(data.get('beat_type', 'N/A')))}</b>", STYLES['Normal'])],
         ['Confidence Score', f"{data.get('confidence', 0)}%"],
-        ['Severity Level', data.get('severity', 'Unknown').upper()],
+        ['Severity Level', severity.upper()],
         ['Signal Quality', data.get('sqi_quality', 'N/A')]
     ]
-    
+
     t = Table(summary_data, colWidths=[2*inch, 4*inch])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (1, 0), colors.HexColor('#f1f5f9')),
-        ('TEXTCOLOR', (0, 0), (1, 0), colors.HexColor('#334155')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-        # Highlight severity row
-        ('TEXTCOLOR', (1, 3), (1, 3), severity_color),
-        ('FONTNAME', (1, 3), (1, 3), 'Helvetica-Bold'),
-    ]))
+    # Highlight severity row
+    t.setStyle(TableStyle(SUMMARY_TABLE_STYLE + [('TEXTCOLOR', (1, 3), (1, 3), severity_color)]))
     elements.append(t)
     elements.append(Spacer(1, 20))
-    
+
     # ECG Plot
-    elements.append(Paragraph("Analyzed Signal Segment", subtitle_style))
+    elements.append(Paragraph("Analyzed Signal Segment", SUBTITLE_STYLE))
     img_buffer = create_ecg_plot(data.get('signal', []))
     img = Image(img_buffer, width=6*inch, height=2.25*inch)
     elements.append(img)
     elements.append(Spacer(1, 20))
 
     # Detailed Findings
-    elements.append(Paragraph("Clinical Interpretation", subtitle_style))
+    elements.append(Paragraph("Clinical Interpretation", SUBTITLE_STYLE))
     description = data.get('description', 'No specific description available.')
-    elements.append(Paragraph(description, styles['Normal']))
+    elements.append(Paragraph(escape(str(description)), STYLES['Normal']))
     elements.append(Spacer(1, 10))
-    
+
     # Disclaimer
     elements.append(Spacer(1, 40))
-    disclaimer_style = ParagraphStyle(
-        'Disclaimer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.HexColor('#94a3b8'),
-        alignment=1
-    )
-    elements.append(Paragraph(
-        "DISCLAIMER: This report is generated by an AI algorithm (CardioScan) and is for educational/research purposes only. "
-        "It is NOT a medical diagnosis. Please create an appointment with a cardiologist for professional evaluation.",
-        disclaimer_style
-    ))
-    
+    elements.append(Paragraph(DISCLAIMER_TEXT, DISCLAIMER_STYLE))
+
     doc.build(elements)
     buffer.seek(0)
     return buffer
+
+
+# ---------------------------------------------------------------------------
+# Batch reports (rendered in parallel worker processes)
+# ---------------------------------------------------------------------------
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", available_cpus()))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _render_report_bytes(data):
+    return generate_pdf_report(data).getvalue()
+
+
+def get_report_pool():
+    """Lazily start the report process pool ("spawn" keeps TensorFlow out of it)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=REPORT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _pool
+
+
+def generate_pdf_reports(items):
+    """Render one PDF per item, in parallel when there is more than one."""
+    if len(items) <= 1 or REPORT_WORKERS <= 1:
+        return [_render_report_bytes(item) for item in items]
+    chunksize = max(1, len(items) // (REPORT_WORKERS * 4))
+    return list(get_report_pool().map(_render_report_bytes, items, chunksize=chunksize))
+
+
+def generate_report_archive(items, name_template="report_{:04d}.pdf"):
+    """Render reports for many beats and bundle them into a ZIP buffer."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for idx, pdf in enumerate(generate_pdf_reports(items)):
+            archive.writestr(name_template.format(idx), pdf)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,347 @@
+"""
+Incremental rhythm analysis over a continuous ECG record.
+
+The beat classifier only ever sees one 186-sample window. RhythmAnalyzer runs
+it over a record that arrives in chunks. Beats are cut around the detected
+R-peaks (StreamingBeatSegmenter), classified in one batch per chunk, and
+annotated with their RR interval. Runs of beats are then turned into
+episodes: ventricular/supraventricular couplets and runs, bigeminy,
+trigeminy, tachycardia and bradycardia. A sliding rhythm window
+(`window_seconds` long, every `hop_seconds`) reports heart rate, beat counts
+and ectopic burden.
+
+All state is O(1) per beat plus the beats inside one rhythm window, so
+append() only processes the new tail and a record of any length costs
+O(samples).
+"""
+import os
+from collections import deque, namedtuple
+
+import numpy as np
+
+from segmentation import StreamingBeatSegmenter
+
+# Model classes (AAMI groups of the MIT-BIH training labels)
+NORMAL, SUPRAVENTRICULAR, VENTRICULAR, FUSION, UNKNOWN = range(5)
+CLASS_SYMBOLS = ("N", "S", "V", "F", "Q")
+
+RHYTHM_WINDOW_SECONDS = float(os.environ.get("RHYTHM_WINDOW_SECONDS", 10))
+RHYTHM_HOP_SECONDS = float(os.environ.get("RHYTHM_HOP_SECONDS", 2))
+TACHYCARDIA_BPM = 100
+BRADYCARDIA_BPM = 50
+RATE_MIN_BEATS = 8          # consecutive beats for a rate episode
+PATTERN_MIN_CYCLES = 3      # e.g. N-V N-V N-V for bigeminy
+PREMATURE_RATIO = 0.8       # RR below this fraction of the normal RR
+
+Beat = namedtuple("Beat", "index sample label confidence rr_s premature")
+
+
+class _Tracker:
+    """Open episode of consecutive beats; closed when a beat breaks it."""
+
+    def __init__(self, kind_fn, min_beats):
+        self.kind_fn = kind_fn
+        self.min_beats = min_beats
+        self.first = self.last = None
+        self.count = 0
+        self.rr_total = 0.0
+        self.rr_count = 0
+        self.reported = None
+
+    def extend(self, beat):
+        if self.first is None:
+            self.first = beat
+        elif beat.rr_s is not None:
+            self.rr_total += beat.rr_s
+            self.rr_count += 1
+        self.last = beat
+        self.count += 1
+
+    def episode(self, fs):
+        """The open episode as a dict, or None if it is too short."""
+        if self.count < self.min_beats:
+            return None
+        rate = 60.0 * self.rr_count / self.rr_total if self.rr_total else None
+        return {
+            "type": self.kind_fn(self.count, rate),
+            "start_beat": self.first.index,
+            "end_beat": self.last.index,
+            "start_s": round(self.first.sample / fs, 3),
+            "end_s": round(self.last.sample / fs, 3),
+            "beats": self.count,
+            "rate_bpm": round(rate, 1) if rate else None,
+        }
+
+    def onset(self, fs):
+        """The open episode once it qualifies (again after its type changes)."""
+        if self.count < self.min_beats:
+            return None
+        kind = self.kind_fn(self.count, None)
+        if kind == self.reported:
+            return None
+        self.reported = kind
+        return self.episode(fs)
+
+    def reset(self, fs):
+        episode = self.episode(fs)
+        self.first = self.last = None
+        self.count = 0
+        self.rr_total = 0.0
+        self.rr_count = 0
+        self.reported = None
+        return episode
+
+
+class _RunTracker(_Tracker):
+    """Consecutive beats of one class: a couplet (2) or a run (3+)."""
+
+    def __init__(self, label, name):
+        super().__init__(
+            lambda n, rate: f"{name}_couplet" if n == 2 else f"{name}_run", min_beats=2
+        )
+        self.label = label
+
+    def update(self, beat, fs):
+        if beat.label == self.label:
+            self.extend(beat)
+            return None
+        return self.reset(fs)
+
+
+class _GroupTracker(_Tracker):
+    """Every `period`-th beat ventricular, the others normal (bigeminy: 2)."""
+
+    def __init__(self, period, name, min_cycles=PATTERN_MIN_CYCLES):
+        super().__init__(lambda n, rate: name, min_beats=period * min_cycles)
+        self.period = period
+        self._normals = []  # normal beats since the last ventricular one
+
+    def update(self, beat, fs):
+        closed = None
+        if beat.label == NORMAL:
+            self._normals.append(beat)
+            if len(self._normals) >= self.period:
+                closed = self.reset(fs)
+                self._normals = self._normals[-(self.period - 1):]
+        elif beat.label == VENTRICULAR and len(self._normals) == self.period - 1:
+            for normal in self._normals:
+                self.extend(normal)
+            self.extend(beat)
+            self._normals = []
+        else:
+            closed = self.reset(fs)
+            self._normals = []
+        return closed
+
+
+class _RateTracker(_Tracker):
+    """Consecutive beats whose instantaneous rate passes `test`."""
+
+    def __init__(self, name, test, min_beats=RATE_MIN_BEATS):
+        super().__init__(lambda n, rate: name, min_beats=min_beats)
+        self.test = test
+
+    def update(self, beat, fs):
+        if beat.rr_s and self.test(60.0 / beat.rr_s):
+            self.extend(beat)
+            return None
+        return self.reset(fs)
+
+
+class RhythmAnalyzer:
+    """
+    Feed samples with append(), get events back.
+
+    `predict_fn(X)` returns class probabilities for a (N, 186, 1) float32
+    batch of beat windows, resampled to 125 Hz whatever `fs` is. Events are
+    dicts with one key: "beat" (unless `emit_beats` is False), "onset" (as
+    soon as an episode qualifies), "episode" (when it ends) or "window" (the
+    sliding rhythm window). finish() flushes the tail and closes open
+    episodes; summary() describes everything seen so far.
+    """
+
+    def __init__(self, predict_fn, fs=125, align="start",
+                 window_seconds=RHYTHM_WINDOW_SECONDS, hop_seconds=RHYTHM_HOP_SECONDS,
+                 class_names=CLASS_SYMBOLS, emit_beats=True):
+        if window_seconds <= 0 or hop_seconds <= 0:
+            raise ValueError("window_seconds and hop_seconds must be positive")
+        self.predict_fn = predict_fn
+        self.fs = fs
+        self.class_names = list(class_names)
+        self.emit_beats = emit_beats
+        self.segmenter = StreamingBeatSegmenter(fs=fs, align=align)
+        self.window = int(round(window_seconds * fs))
+        self.hop = max(1, int(round(hop_seconds * fs)))
+
+        self.beat_count = 0
+        self.class_counts = [0] * len(self.class_names)
+        self.episode_counts = {}
+        self._last_peak = None
+        self._normal_rr = None
+        self._trackers = [
+            _RunTracker(VENTRICULAR, "ventricular"),
+            _RunTracker(SUPRAVENTRICULAR, "supraventricular"),
+            _GroupTracker(2, "bigeminy"),
+            _GroupTracker(3, "trigeminy"),
+            _RateTracker("tachycardia", lambda bpm: bpm > TACHYCARDIA_BPM),
+            _RateTracker("bradycardia", lambda bpm: bpm < BRADYCARDIA_BPM),
+        ]
+        # Beats of the current rhythm window, with running totals
+        self._window_beats = deque()
+        self._window_counts = [0] * len(self.class_names)
+        self._window_rr = 0.0
+        self._window_rr_count = 0
+        self._next_window_end = self.hop
+
+    @property
+    def samples_seen(self) -> int:
+        return self.segmenter.samples_seen
+
+    def append(self, samples):
+        """Process new samples; returns the events they complete."""
+        beats = self.segment(samples)
+        return self.add(beats, self.classify(beats))
+
+    def finish(self):
+        """End of record: classify the tail and close open episodes."""
+        beats = self.segment(None, final=True)
+        return self.add(beats, self.classify(beats), final=True)
+
+    # append() in two halves, for callers that classify the beats elsewhere
+    # (e.g. batched across many live sessions, see live.py)
+    def segment(self, samples, final=False):
+        """(peak, window) beats whose windows are complete (all, if `final`)."""
+        return self.segmenter.flush() if final else self.segmenter.feed(samples)
+
+    def classify(self, beats):
+        if not beats:
+            return []
+        return self.predict_fn(np.stack([window for _, window in beats])[:, :, np.newaxis])
+
+    def add(self, beats, probabilities, final=False):
+        """Events for segmented beats and their class probabilities."""
+        events = self._process(beats, probabilities)
+        if not final:
+            # Every peak before this sample has been detected and classified
+            events.extend(self._windows_until(self.samples_seen - self.segmenter.post))
+            return events
+        events.extend(self._windows_until(self.samples_seen))
+        for tracker in self._trackers:
+            episode = tracker.reset(self.fs)
+            if episode:
+                events.append(self._episode_event(episode))
+        return events
+
+    def summary(self) -> dict:
+        return {
+            "total_beats": self.beat_count,
+            "total_samples": self.samples_seen,
+            "duration_s": round(self.samples_seen / self.fs, 3),
+            "beat_counts": dict(zip(self.class_names, self.class_counts)),
+            "episode_counts": dict(self.episode_counts),
+        }
+
+    # ------------------------------------------------------------------
+    def _process(self, beats, probabilities):
+        events = []
+        for (peak, _), probs in zip(beats, probabilities):
+            label = int(np.argmax(probs))
+            beat = self._annotate(peak, label, float(probs[label]))
+            self.beat_count += 1
+            self.class_counts[label] += 1
+
+            events.extend(self._windows_until(peak))
+            self._window_add(beat)
+            if self.emit_beats:
+                events.append({"beat": self._beat_fields(beat)})
+            for tracker in self._trackers:
+                episode = tracker.update(beat, self.fs)
+                if episode:
+                    events.append(self._episode_event(episode))
+                onset = tracker.onset(self.fs)
+                if onset:
+                    events.append({"onset": onset})
+        return events
+
+    def _annotate(self, peak, label, confidence):
+        """Beat with its RR interval and whether it came early."""
+        rr_s = None if self._last_peak is None else (peak - self._last_peak) / self.fs
+        self._last_peak = peak
+        premature = False
+        if rr_s is not None:
+            if self._normal_rr is not None:
+                premature = rr_s < PREMATURE_RATIO * self._normal_rr
+            if label == NORMAL and not premature:
+                # Running mean RR of normal beats, the reference for prematurity
+                self._normal_rr = (
+                    rr_s if self._normal_rr is None else 0.9 * self._normal_rr + 0.1 * rr_s
+                )
+        return Beat(self.beat_count, peak, label, confidence, rr_s, premature)
+
+    def _beat_fields(self, beat):
+        return {
+            "beat": beat.index,
+            "sample": beat.sample,
+            "time_s": round(beat.sample / self.fs, 3),
+            "label": beat.label,
+            "beat_type": self.class_names[beat.label],
+            "confidence": round(beat.confidence * 100, 2),
+            "rr_ms": round(beat.rr_s * 1000, 1) if beat.rr_s is not None else None,
+            "premature": beat.premature,
+        }
+
+    def _episode_event(self, episode):
+        self.episode_counts[episode["type"]] = self.episode_counts.get(episode["type"], 0) + 1
+        return {"episode": episode}
+
+    def _window_add(self, beat):
+        self._window_beats.append(beat)
+        self._window_counts[beat.label] += 1
+        if beat.rr_s is not None:
+            self._window_rr += beat.rr_s
+            self._window_rr_count += 1
+
+    def _windows_until(self, sample):
+        """Rhythm windows ending at or before `sample` (all their beats are in)."""
+        events = []
+        while self._next_window_end <= sample:
+            end = self._next_window_end
+            start = max(0, end - self.window)
+            while self._window_beats and self._window_beats[0].sample < start:
+                beat = self._window_beats.popleft()
+                self._window_counts[beat.label] -= 1
+                if beat.rr_s is not None:
+                    self._window_rr -= beat.rr_s
+                    self._window_rr_count -= 1
+            events.append({"window": self._window_fields(start, end)})
+            self._next_window_end += self.hop
+        return events
+
+    def _window_fields(self, start, end):
+        # Beats of later windows may already be queued; count up to `end` only
+        counts = list(self._window_counts)
+        rr_total, rr_count = self._window_rr, self._window_rr_count
+        for beat in reversed(self._window_beats):
+            if beat.sample < end:
+                break
+            counts[beat.label] -= 1
+            if beat.rr_s is not None:
+                rr_total -= beat.rr_s
+                rr_count -= 1
+        beats = sum(counts)
+        active = [
+            tracker.kind_fn(tracker.count, None)
+            for tracker in self._trackers
+            if tracker.count >= tracker.min_beats and tracker.last.sample < end
+        ]
+        return {
+            "start_s": round(start / self.fs, 3),
+            "end_s": round(end / self.fs, 3),
+            "beats": beats,
+            "heart_rate_bpm": round(60.0 * rr_count / rr_total, 1) if rr_total > 0 else None,
+            "beat_counts": dict(zip(self.class_names, counts)),
+            "ectopic_percent": (
+                round(100.0 * (beats - counts[NORMAL]) / beats, 1) if beats else 0.0
+            ),
+            "active_episodes": active,
+        }
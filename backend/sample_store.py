@@ -0,0 +1,124 @@
+import os
+import threading
+
+import numpy as np
+
+from csv_stream import CsvRowReader
+
+TARGET_LENGTH = 186
+LABELED_COLUMNS = 188  # MIT-BIH CSVs: 187 beat samples, then the class label
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+NO_LABEL = -1
+SIGNAL_DTYPE = np.float64
+
+
+class SampleDataset:
+    """
+    Demo/sample ECG beats served from memory-mapped NumPy arrays.
+
+    The source CSV (MIT-BIH layout: beat samples followed by the class label
+    in the last column) is converted once into `<name>.signals.npy`
+    (float64, rows x 186, so samples keep the CSV's decimal values) and
+    `<name>.labels.npy` (int8) in `cache_dir`. The conversion is redone
+    only when the CSV is newer than the cache (or the cache holds another
+    dtype), so any later start just memory-maps the arrays and a lookup
+    costs the same for the 6-row demo file as for the full MIT-BIH test
+    split. Only files with exactly 188 columns have a label column; rows of
+    any other width are all samples and have no labels (NO_LABEL).
+    """
+
+    def __init__(self, path=None, cache_dir=None):
+        self.path = path or os.environ.get(
+            "SAMPLE_DATASET", os.path.join(BACKEND_DIR, "sample.csv")
+        )
+        self.cache_dir = cache_dir or os.environ.get(
+            "SAMPLE_CACHE_DIR", os.path.join(BACKEND_DIR, "sample_cache")
+        )
+        self.signals = None
+        self.labels = None
+        self._class_rows = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return self.signals is not None or os.path.exists(self.path)
+
+    def _cache_paths(self):
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        return (
+            os.path.join(self.cache_dir, f"{name}.signals.npy"),
+            os.path.join(self.cache_dir, f"{name}.labels.npy"),
+        )
+
+    def _convert(self, signals_path, labels_path):
+        """Stream the CSV into .npy files (written under temp names, then renamed)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        signal_blocks, label_blocks = [], []
+        with open(self.path, "rb") as stream:
+            for _, block in CsvRowReader(stream, n_cols=None, dtype=SIGNAL_DTYPE):
+                signal_blocks.append(block[:, :TARGET_LENGTH])
+                if block.shape[1] == LABELED_COLUMNS:
+                    label_blocks.append(block[:, -1].astype(np.int8))
+                else:
+                    label_blocks.append(np.full(len(block), NO_LABEL, dtype=np.int8))
+        if not signal_blocks:
+            raise ValueError(f"Sample dataset {self.path} is empty")
+
+        pid = os.getpid()
+        for path, blocks in ((signals_path, signal_blocks), (labels_path, label_blocks)):
+            tmp_path = f"{path}.{pid}.tmp.npy"
+            np.save(tmp_path, np.concatenate(blocks))
+            os.replace(tmp_path, path)
+
+    def load(self):
+        """Convert the CSV if needed and memory-map the arrays (idempotent)."""
+        with self._lock:
+            if self.signals is not None:
+                return self
+            signals_path, labels_path = self._cache_paths()
+            source_mtime = os.path.getmtime(self.path)
+            if not all(
+                os.path.exists(p) and os.path.getmtime(p) >= source_mtime
+                for p in (signals_path, labels_path)
+            ) or np.load(signals_path, mmap_mode="r").dtype != SIGNAL_DTYPE:
+                self._convert(signals_path, labels_path)
+                print(f"[INFO] Converted sample dataset {self.path} -> {self.cache_dir}")
+            labels = np.load(labels_path, mmap_mode="r")
+            self._class_rows = {
+                int(label): np.flatnonzero(labels == label) for label in np.unique(labels)
+            }
+            self.labels = labels
+            self.signals = np.load(signals_path, mmap_mode="r")
+        return self
+
+    def __len__(self):
+        return len(self.load().signals)
+
+    def rows(self, label=None):
+        """Row indices for one class, or None for the whole dataset."""
+        self.load()
+        if label is None:
+            return None
+        return self._class_rows.get(int(label), np.empty(0, dtype=np.intp))
+
+    def count(self, label=None):
+        rows = self.rows(label)
+        return len(self.signals) if rows is None else len(rows)
+
+    def resolve(self, index, label=None):
+        """Absolute row of the `index`-th sample (within `label` if given)."""
+        rows = self.rows(label)
+        return int(index if rows is None else rows[index])
+
+    def random_row(self, label=None, rng=None):
+        """A random absolute row, or None if the class has no samples."""
+        n = self.count(label)
+        if n == 0:
+            return None
+        rng = rng or np.random.default_rng()
+        return self.resolve(int(rng.integers(n)), label)
+
+    def get(self, row):
+        """(copy of the float64 signal, label) for an absolute row."""
+        self.load()
+        return np.array(self.signals[row]), int(self.labels[row])
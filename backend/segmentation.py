@@ -0,0 +1,132 @@
+import numpy as np
+
+import preprocessing
+
+TARGET_LENGTH = 186
+
+
+class StreamingBeatSegmenter:
+    """
+    Incremental R-peak detector that cuts fixed-length beat windows.
+
+    Samples are fed in arbitrary-sized chunks; only a bounded history is kept
+    (a few seconds plus one window), so memory stays constant no matter how
+    long the record is. A peak is a local maximum above `threshold` of the
+    recent signal range, at least `refractory` seconds after the previous
+    one. Each beat is emitted once enough samples after it have arrived.
+
+    Windows always cover `window` samples at the model rate `target_fs`:
+    at any other `fs` the cut is wider or narrower and is resampled to
+    `target_fs` (peak indices stay in input samples).
+
+    align="start" (default) starts the window at the peak, which is how the
+    MIT-BIH training beats are laid out; align="center" cuts it around the
+    peak.
+    """
+
+    def __init__(self, fs=125, window=TARGET_LENGTH, align="start",
+                 threshold=0.6, refractory=0.2, history_seconds=3.0,
+                 normalize=True, target_fs=preprocessing.TARGET_FS):
+        if align not in ("center", "start"):
+            raise ValueError("align must be 'center' or 'start'")
+        if fs <= 0:
+            raise ValueError("fs must be positive")
+        self.fs = fs
+        self.target_fs = target_fs
+        self.window = window
+        self.align = align
+        self.threshold = threshold
+        self.refractory = max(1, int(round(refractory * fs)))
+        self.normalize = normalize
+
+        # Input samples that resample to at least `window` samples
+        self.span = int(np.ceil((window - 1) * fs / target_fs)) + 1
+        self.pre = self.span // 2 if align == "center" else 0
+        self.post = self.span - self.pre
+        self.history = max(int(history_seconds * fs), self.span) + self.span
+
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._offset = 0            # absolute index of self._buffer[0]
+        self._scanned = 1           # next absolute index to test for a peak
+        self._last_peak = None
+        self._pending = []          # detected peaks waiting for their window
+
+    @property
+    def samples_seen(self) -> int:
+        return self._offset + len(self._buffer)
+
+    def feed(self, samples):
+        """Add samples; return a list of (peak_index, window) ready beats."""
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        if len(samples):
+            self._buffer = np.concatenate((self._buffer, samples))
+            self._detect(final=False)
+        beats = self._emit(final=False)
+        self._trim()
+        return beats
+
+    def flush(self):
+        """Finish the stream: detect the tail and pad the last windows."""
+        self._detect(final=True)
+        return self._emit(final=True)
+
+    # ------------------------------------------------------------------
+    def _detect(self, final):
+        buf = self._buffer
+        # A sample needs its right neighbour before it can be a local max
+        stop = self.samples_seen - (0 if final else 1)
+        start = max(self._scanned, self._offset + 1)
+        if stop - start < 1:
+            return
+        lo, hi = start - self._offset, stop - self._offset
+        seg = buf[lo - 1 : min(hi + 1, len(buf))]
+        if len(seg) < 3:
+            return
+
+        # Adaptive threshold from the retained history
+        sig_min, sig_max = float(buf.min()), float(buf.max())
+        span = sig_max - sig_min
+        if span == 0:
+            self._scanned = stop
+            return
+        level = sig_min + self.threshold * span
+
+        centre = seg[1:-1]
+        is_peak = (centre > level) & (centre > seg[:-2]) & (centre >= seg[2:])
+        candidates = np.nonzero(is_peak)[0] + start
+        for idx in candidates:
+            if self._last_peak is None or idx - self._last_peak > self.refractory:
+                self._pending.append(int(idx))
+                self._last_peak = int(idx)
+        self._scanned = start + len(centre)
+
+    def _emit(self, final):
+        beats = []
+        end_abs = self.samples_seen
+        keep = []
+        for peak in self._pending:
+            w_start, w_end = peak - self.pre, peak + self.post
+            if w_end > end_abs and not final:
+                keep.append(peak)
+                continue
+            if w_start < self._offset:
+                # Beat too close to the start of the record to cut a window
+                continue
+            seg = self._buffer[w_start - self._offset : w_end - self._offset]
+            seg = preprocessing.resample(seg, self.fs, self.target_fs)[: self.window]
+            window = np.zeros(self.window, dtype=np.float32)
+            window[: len(seg)] = seg
+            if self.normalize:
+                body = window[: len(seg)]
+                preprocessing.normalize(body, "minmax", out=body)
+            beats.append((peak, window))
+        self._pending = keep
+        return beats
+
+    def _trim(self):
+        excess = len(self._buffer) - self.history
+        if self._pending:
+            excess = min(excess, self._pending[0] - self.pre - self._offset)
+        if excess > 0:
+            self._buffer = self._buffer[excess:]
+            self._offset += excess
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+import ecg_features
+from sample_store import SampleDataset
+
+# Peaks, bpm and rr_avg (ms) of each sample.csv row from the original
+# loop-based extract_features(); they feed the /api/explain prompt and the
+# LLM cache key, so they must not drift.
+BASELINE = [
+    ([71], 0, 0),
+    ([124], 0, 0),
+    ([88], 0, 0),
+    ([50], 0, 0),
+    ([37, 89], 144, 416),
+    ([1, 35, 85], 179, 336),
+]
+
+
+@pytest.mark.parametrize("row", range(len(BASELINE)))
+def test_sample_features_match_baseline(row):
+    signal, _ = SampleDataset().load().get(row)
+    features = ecg_features.compute_features(signal)
+    peaks, bpm, rr_avg = BASELINE[row]
+    assert features["peaks"].tolist() == peaks
+    assert int(round(features["bpm"])) == bpm
+    assert int(round(features["rr_avg_ms"])) == rr_avg
+    assert round(features["amplitude"], 3) == 1.0
+
+
+def test_edge_samples_are_not_peaks():
+    signal = np.array([1.0, 0.2, 0.1, 0.9, 0.1, 0.0] + [0.0] * 30 + [0.2, 1.0])
+    assert ecg_features.detect_r_peaks(signal).tolist() == [3]
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import preprocessing
+from rhythm import RhythmAnalyzer
+from sample_store import SampleDataset
+
+# Rows of sample.csv: labels [2, 2, 1, 2, 1, 1] (V, V, S, V, S, S)
+PATTERN = [2, 4, 5] * 3 + [0, 1, 3] + [2, 4, 5] * 3 + [0, 3, 4, 5, 2]
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return SampleDataset().load()
+
+
+@pytest.fixture(scope="module")
+def record(dataset):
+    """Dataset beats (each trimmed after its last sample) laid end to end."""
+    beats = []
+    for row in PATTERN * 4:
+        signal, _ = dataset.get(row)
+        beats.append(signal[: np.flatnonzero(signal).max() + 1])
+    return np.concatenate(beats).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def classify(dataset):
+    """Nearest-template classifier over the dataset beats, standing in for the model."""
+    rows = [dataset.get(row) for row in range(dataset.count())]
+    templates = np.stack([signal for signal, _ in rows]).astype(np.float32)
+    labels = np.array([label for _, label in rows])
+
+    def predict(X):
+        X = X.reshape(len(X), -1)
+        nearest = ((X[:, None, :] - templates[None]) ** 2).sum(axis=-1).argmin(axis=1)
+        probabilities = np.zeros((len(X), 5), dtype=np.float32)
+        probabilities[np.arange(len(X)), labels[nearest]] = 1
+        return probabilities
+
+    return predict
+
+
+def analyze(classify, signal, fs, chunk=500):
+    analyzer = RhythmAnalyzer(classify, fs=fs, emit_beats=False)
+    events = []
+    for start in range(0, len(signal), chunk):
+        events += analyzer.append(signal[start : start + chunk])
+    events += analyzer.finish()
+    return analyzer, [event["episode"] for event in events if "episode" in event]
+
+
+def test_same_episodes_at_125_and_250_hz(classify, record):
+    upsampled = preprocessing.resample(record, 125, 250)
+    at_125, episodes_125 = analyze(classify, record, 125)
+    at_250, episodes_250 = analyze(classify, upsampled, 250)
+
+    assert episodes_125
+    assert at_250.beat_count == at_125.beat_count
+    assert at_250.class_counts == at_125.class_counts
+    assert [(e["type"], e["beats"]) for e in episodes_250] == [
+        (e["type"], e["beats"]) for e in episodes_125
+    ]
+    for e250, e125 in zip(episodes_250, episodes_125):
+        assert e250["start_s"] == pytest.approx(e125["start_s"], abs=0.02)
+        assert e250["end_s"] == pytest.approx(e125["end_s"], abs=0.02)
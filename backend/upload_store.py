@@ -0,0 +1,171 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from csv_stream import CsvRowReader
+
+TARGET_LENGTH = 186
+HANDLE_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 50 * 1024 * 1024))
+UPLOAD_QUOTA_BYTES = int(os.environ.get("UPLOAD_QUOTA_BYTES", 1024 * 1024 * 1024))
+
+
+class UploadTooLarge(ValueError):
+    """An upload is larger than the store accepts."""
+
+
+class _HashingReader:
+    """File-like wrapper that hashes (and counts) everything read through it."""
+
+    def __init__(self, stream, max_bytes=0):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        if self.max_bytes and self.bytes_read > self.max_bytes:
+            raise UploadTooLarge(f"Uploads are limited to {self.max_bytes} bytes")
+        self.digest.update(data)
+        return data
+
+
+class UploadStore:
+    """
+    Parse-once storage for uploaded CSV files.
+
+    Each upload is streamed through CsvRowReader into a float32 .npy file
+    named after the SHA-256 of its content, so re-uploading the same file
+    reuses the existing array. Arrays are opened memory-mapped (read-only),
+    which makes a row lookup O(1) and lets every worker share the page cache.
+    Files older than `ttl_seconds` are removed when new uploads arrive, and
+    the least recently uploaded ones once the stored arrays exceed
+    `quota_bytes`. Uploads larger than `max_bytes` are refused with
+    UploadTooLarge. A limit of 0 disables it.
+    """
+
+    def __init__(self, directory=None, ttl_seconds=None, max_open=32,
+                 max_bytes=UPLOAD_MAX_BYTES, quota_bytes=UPLOAD_QUOTA_BYTES):
+        self.directory = directory or os.environ.get(
+            "UPLOAD_DIR", os.path.join(os.path.dirname(__file__), "uploads")
+        )
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.environ.get("UPLOAD_TTL_SECONDS", 24 * 3600))
+        )
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self.quota_bytes = quota_bytes
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, handle):
+        if not isinstance(handle, str) or not HANDLE_PATTERN.match(handle):
+            raise KeyError(handle)
+        return os.path.join(self.directory, f"{handle}.npy")
+
+    def add(self, stream, block_rows=4096):
+        """Store a CSV stream; return (handle, rows array)."""
+        os.makedirs(self.directory, exist_ok=True)
+        reader = _HashingReader(stream, self.max_bytes)
+        rows = CsvRowReader(reader, n_cols=TARGET_LENGTH, block_rows=block_rows)
+
+        # Parsed rows go to a scratch file first, since the row count (and
+        # therefore the .npy header) is only known at the end of the stream
+        width = None
+        with tempfile.TemporaryFile(dir=self.directory) as scratch:
+            for _, block in rows:
+                if width is None:
+                    width = block.shape[1]
+                elif block.shape[1] != width:
+                    raise ValueError("Rows have inconsistent column counts")
+                scratch.write(np.ascontiguousarray(block, dtype=np.float32).tobytes())
+            if not rows.total_rows:
+                raise ValueError("CSV file is empty")
+
+            handle = reader.digest.hexdigest()
+            path = self._path(handle)
+            if not os.path.exists(path):
+                scratch.seek(0)
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".npy.tmp")
+                os.close(fd)
+                out = np.lib.format.open_memmap(
+                    tmp_path, mode="w+", dtype=np.float32,
+                    shape=(rows.total_rows, width),
+                )
+                flat = out.reshape(-1)
+                chunk = block_rows * width
+                for start in range(0, flat.size, chunk):
+                    data = np.frombuffer(scratch.read(chunk * 4), dtype=np.float32)
+                    flat[start : start + len(data)] = data
+                out.flush()
+                del out, flat
+                os.replace(tmp_path, path)  # atomic, safe across workers
+            else:
+                os.utime(path)
+
+        self.prune()
+        return handle, self.get(handle)
+
+    def get(self, handle):
+        """Memory-mapped (rows, columns) float32 array for a handle."""
+        path = self._path(handle)
+        with self._lock:
+            if handle in self._open:
+                self._open.move_to_end(handle)
+                return self._open[handle]
+        if not os.path.exists(path):
+            raise KeyError(handle)
+        array = np.load(path, mmap_mode="r")
+        with self._lock:
+            self._open[handle] = array
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return array
+
+    def prune(self):
+        """
+        Delete stored uploads that have not been re-uploaded within the TTL,
+        then the oldest ones until the rest fit in the quota.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        stored = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            stored.append((stat.st_mtime, stat.st_size, name))
+        stored.sort(reverse=True)  # newest first
+
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds > 0 else None
+        kept = 0
+        for n, (mtime, size, name) in enumerate(stored):
+            expired = cutoff is not None and mtime < cutoff
+            # The newest upload (normally the one just added) always stays
+            over_quota = n > 0 and self.quota_bytes > 0 and kept + size > self.quota_bytes
+            if expired or over_quota:
+                self._remove(name)
+            else:
+                kept += size
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            return
+        with self._lock:
+            self._open.pop(name[: -len(".npy")], None)
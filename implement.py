@@ -8,6 +8,10 @@ import pandas as pd
 from keras.models import load_model
 from collections import Counter
 import matplotlib.pyplot as plt
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from preprocessing import preprocess_batch
 
 set_appearance_mode("light")
 # Load the trained model
@@ -64,29 +68,9 @@ def calculate(f):
         time.sleep(2)
         window.update_idletasks()
     
-    def add_gaussian_noise(signal, target_length=186):
-        current_length = len(signal)
-        noise_length = target_length - current_length
-        if noise_length > 0:
-            noise = np.random.normal(0, 0.5, noise_length)
-            return np.concatenate((signal, noise), axis=0)
-        elif noise_length<0:
-            return signal[:target_length]
-        else:
-            return signal
-    
-    # Create a list to store the noisy signals
-    noisy_signals = []
-    
-    for i in range(X_new.shape[0]):  # Loop over rows in X_new
-        noisy_signal = add_gaussian_noise(X_new[i], target_length=186)
-        noisy_signals.append(noisy_signal)
-    
-    # Convert the list of noisy signals to a NumPy array
-    X_new = np.array(noisy_signals)
-    
-    # Reshape all signals to (186, 1)
-    X_new = X_new.reshape(X_new.shape[0], 186, 1)
+    # Pad/trim every row to 186 samples and reshape to (186, 1), exactly
+    # like the web backend does
+    X_new = preprocess_batch(X_new)
     
     print(X_new.shape)
     